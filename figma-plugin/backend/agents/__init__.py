@@ -1,16 +1,29 @@
 # Growth99 Figma Plugin - LangGraph Agents
-from .requirements_agent import RequirementsAgent
-from .reference_agent import ReferenceAgent
-from .planner_agent import PlannerAgent
-from .composer_agent import ComposerAgent
-from .image_agent import ImageAgent
-from .verifier_agent import VerifierAgent
+# Agents are imported lazily (PEP 562) so importing one agent does not pay
+# the langchain/pydantic import cost of all six.
+import importlib
 
-__all__ = [
-    "RequirementsAgent",
-    "ReferenceAgent", 
-    "PlannerAgent",
-    "ComposerAgent",
-    "ImageAgent",
-    "VerifierAgent"
-]
\ No newline at end of file
+_LAZY_AGENTS = {
+    "RequirementsAgent": "requirements_agent",
+    "ReferenceAgent": "reference_agent",
+    "PlannerAgent": "planner_agent",
+    "ComposerAgent": "composer_agent",
+    "ImageAgent": "image_agent",
+    "VerifierAgent": "verifier_agent",
+}
+
+__all__ = list(_LAZY_AGENTS)
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_AGENTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f".{module_name}", __name__)
+    obj = getattr(module, name)
+    globals()[name] = obj  # cache so __getattr__ runs once per agent
+    return obj
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_AGENTS))
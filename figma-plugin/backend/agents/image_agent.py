@@ -2,46 +2,134 @@
 Image Agent - Generates AI images via Replicate
 """
 
-from typing import Dict, Any, List, Optional
-from pydantic import BaseModel
+import asyncio
+import io
+import json
+import random
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Any, List, Optional
+import httpx
 import replicate
 import os
+from openai import OpenAI
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from .composer_agent import ImageSlot
 
-class GeneratedImage(BaseModel):
+# Pure data carrier filled from values we produce ourselves, so Pydantic
+# validation buys nothing; slots halve per-instance memory and skip the
+# per-field validation cost on construction
+@dataclass(slots=True)
+class GeneratedImage:
     role: str
     url: str
     prompt_used: str
     style_applied: str
 
+# Resolve the token and build the Replicate client once; every agent
+# instance shares the same session, so keepalive connections survive
+# across requests instead of being re-established per agent
+_REPLICATE_TOKEN = os.getenv("REPLICATE_API_TOKEN")
+_REPLICATE_CLIENT = replicate.Client(
+    api_token=_REPLICATE_TOKEN,
+    timeout=httpx.Timeout(120),
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+) if _REPLICATE_TOKEN else None
+
+# Templates are parsed once at import and shared across agent instances
+# instead of being rebuilt in every __init__
+_PROMPT_ENHANCEMENT_TEMPLATE = ChatPromptTemplate.from_messages([
+    ("system", """You are a prompt engineer for healthcare marketing imagery.
+
+    Enhance image generation prompts for professional medical/healthcare marketing materials.
+
+    GUIDELINES:
+    - Professional, clean, modern aesthetic
+    - Diverse representation when showing people
+    - Medical accuracy and sensitivity
+    - Brand-appropriate styling
+    - High-quality commercial photography look
+
+    OUTPUT GUIDELINES:
+    - Start with subject/scene description
+    - Add style and quality modifiers
+    - Include technical photography terms
+    - Add negative prompts for unwanted elements
+
+    Keep prompts under 200 characters for optimal results."""),
+    ("human", "Base prompt: {base_prompt}\nStyle hints: {style_hints}\nBusiness context: {business_context}")
+])
+
+_BATCH_ENHANCEMENT_TEMPLATE = ChatPromptTemplate.from_messages([
+    ("system", """You are a prompt engineer for healthcare marketing imagery.
+
+    Enhance ALL of the provided image generation prompts for professional
+    medical/healthcare marketing materials, in one pass.
+
+    GUIDELINES:
+    - Professional, clean, modern aesthetic
+    - Diverse representation when showing people
+    - Medical accuracy and sensitivity
+    - Brand-appropriate styling
+    - High-quality commercial photography look
+
+    Keep each prompt under 200 characters for optimal results.
+
+    Return ONLY a JSON object with this exact structure:
+    {{"enhancements": [{{"role": "slot role", "prompt": "enhanced prompt"}}]}}
+    with one entry per input slot."""),
+    ("human", "Slots to enhance:\n{slots_json}\n\nBusiness context: {business_context}")
+])
+
+# Pure lookup data, hoisted so the dicts aren't rebuilt per call; tuples keep
+# the style options immutable and the method hands out fresh lists to callers
+_SUPPORTED_STYLES: Dict[str, tuple] = {
+    "mood": ("professional", "warm", "modern", "luxurious", "clinical", "welcoming"),
+    "lighting": ("natural", "soft", "bright", "dramatic", "ambient"),
+    "composition": ("centered", "rule-of-thirds", "wide-angle", "close-up", "environmental"),
+    "color_palette": ("neutral", "blue-medical", "green-wellness", "warm-tones", "high-contrast"),
+    "photography_style": ("commercial", "lifestyle", "clinical", "architectural", "portrait")
+}
+
+# Different placeholder services based on role
+_PLACEHOLDER_URLS = {
+    "hero": "https://images.unsplash.com/photo-1559757148-5c350d0d3c56?w=800&h=600&fit=crop&crop=center",  # Medical facility
+    "logo": "https://via.placeholder.com/200x80/2563EB/FFFFFF?text=LOGO",
+    "team": "https://images.unsplash.com/photo-1612349317150-e413f6a5b16d?w=800&h=600&fit=crop&crop=center",  # Medical team
+    "service": "https://images.unsplash.com/photo-1576091160399-112ba8d25d1f?w=800&h=600&fit=crop&crop=center",  # Medical equipment
+    "about": "https://images.unsplash.com/photo-1519494026892-80bbd2d6fd0d?w=800&h=600&fit=crop&crop=center"   # Modern medical building
+}
+
+_FALLBACK_PLACEHOLDER_URL = "https://via.placeholder.com/800x600/CCCCCC/666666?text=Image"
+
 class ImageAgent:
+    prompt_enhancement_template = _PROMPT_ENHANCEMENT_TEMPLATE
+    batch_enhancement_template = _BATCH_ENHANCEMENT_TEMPLATE
+
     def __init__(self, llm_client: ChatOpenAI):
         self.llm = llm_client
-        self.replicate_client = replicate.Client(api_token=os.getenv("REPLICATE_API_TOKEN")) if os.getenv("REPLICATE_API_TOKEN") else None
-        
-        self.prompt_enhancement_template = ChatPromptTemplate.from_messages([
-            ("system", """You are a prompt engineer for healthcare marketing imagery.
-            
-            Enhance image generation prompts for professional medical/healthcare marketing materials.
-            
-            GUIDELINES:
-            - Professional, clean, modern aesthetic
-            - Diverse representation when showing people
-            - Medical accuracy and sensitivity
-            - Brand-appropriate styling
-            - High-quality commercial photography look
-            
-            OUTPUT GUIDELINES:
-            - Start with subject/scene description
-            - Add style and quality modifiers
-            - Include technical photography terms
-            - Add negative prompts for unwanted elements
-            
-            Keep prompts under 200 characters for optimal results."""),
-            ("human", "Base prompt: {base_prompt}\nStyle hints: {style_hints}\nBusiness context: {business_context}")
-        ])
+        self.replicate_client = _REPLICATE_CLIENT
+        # Enhanced prompts are capped at ~200 characters by instruction, so
+        # bound the completion at the API level too - every unused output
+        # token is pure latency on the per-slot critical path
+        self._fast_llm = llm_client.bind(max_tokens=80)
+        # Bound fan-out so a page full of slots doesn't trip provider rate
+        # limits; transient failures are retried with backoff instead of
+        # degrading straight to placeholders
+        self._replicate_sem = asyncio.Semaphore(int(os.getenv("REPLICATE_CONCURRENCY", "8")))
+        self._llm_sem = asyncio.Semaphore(16)
+
+    async def _retry(self, coro_fn, attempts: int = 3, base: float = 0.5):
+        """Run coro_fn with exponential backoff; re-raise after the last attempt"""
+        for attempt in range(attempts):
+            try:
+                return await coro_fn()
+            except Exception as e:
+                if attempt == attempts - 1:
+                    raise
+                delay = base * 2 ** attempt + random.random() * 0.1
+                print(f"Retrying after error ({attempt + 1}/{attempts}): {e}")
+                await asyncio.sleep(delay)
 
     async def generate_images(
         self, 
@@ -51,47 +139,117 @@ class ImageAgent:
     ) -> List[GeneratedImage]:
         """Generate images for all slots using Replicate"""
         
+        return [
+            image async for image in
+            self.generate_images_stream(image_slots, business_context, model)
+        ]
+
+    async def generate_images_stream(
+        self,
+        image_slots: List[ImageSlot],
+        business_context: str = "",
+        model: str = "stability-ai/sdxl:7762fd07cf82c948538e41f63f77d685e02b063e37e496e96eefd46c929f9bdc"
+    ) -> AsyncIterator[GeneratedImage]:
+        """Yield generated images as each slot finishes, fastest first"""
+
         if not self.replicate_client:
-            return self._generate_placeholder_images(image_slots)
-        
-        generated_images = []
-        
-        for slot in image_slots:
-            try:
-                # Enhance prompt using GPT-5
-                enhanced_prompt = await self._enhance_prompt(slot, business_context)
-                
-                # Generate image via Replicate
-                image_url = await self._generate_single_image(enhanced_prompt, model)
-                
-                if image_url:
-                    generated_images.append(GeneratedImage(
-                        role=slot.role,
-                        url=image_url,
-                        prompt_used=enhanced_prompt,
-                        style_applied=str(slot.styleHints)
-                    ))
-                else:
-                    # Fallback to placeholder
-                    generated_images.append(self._create_placeholder_image(slot))
-                    
-            except Exception as e:
-                print(f"Failed to generate image for {slot.role}: {e}")
-                generated_images.append(self._create_placeholder_image(slot))
-        
-        return generated_images
-    
-    async def _enhance_prompt(self, slot: ImageSlot, business_context: str) -> str:
-        """Enhance image prompt using GPT-5"""
-        
+            for placeholder in self._generate_placeholder_images(image_slots):
+                yield placeholder
+            return
+
+        # All slot prompts are rewritten in one LLM round-trip instead of
+        # one call per slot
+        enhanced_prompts = await self._enhance_prompts_batch(image_slots, business_context)
+
+        # Slots are independent and bound by network/LLM latency, so run
+        # them concurrently and surface each result the moment it lands:
+        # downstream consumers can start composing with the first image
+        # while the slowest SDXL call is still rendering
+        tasks = [
+            asyncio.ensure_future(
+                self._process_slot(slot, business_context, model, enhanced_prompts.get(slot.role))
+            )
+            for slot in image_slots
+        ]
+        for future in asyncio.as_completed(tasks):
+            yield await future
+
+    async def _enhance_prompts_batch(
+        self,
+        slots: List[ImageSlot],
+        business_context: str
+    ) -> Dict[str, str]:
+        """Enhance all slot prompts with a single LLM call, keyed by role"""
+
+        if not slots:
+            return {}
+
+        slots_json = json.dumps([
+            {"role": slot.role, "base_prompt": slot.prompt, "style_hints": slot.styleHints}
+            for slot in slots
+        ])
+
         try:
             response = await self.llm.ainvoke(
-                self.prompt_enhancement_template.format(
-                    base_prompt=slot.prompt,
-                    style_hints=slot.styleHints,
+                self.batch_enhancement_template.format(
+                    slots_json=slots_json,
                     business_context=business_context
                 )
             )
+            data = json.loads(response.content)
+            return {
+                item["role"]: item["prompt"]
+                for item in data.get("enhancements", [])
+                if item.get("role") and item.get("prompt")
+            }
+        except Exception as e:
+            print(f"Failed to batch-enhance prompts: {e}")
+            return {}
+
+    async def _process_slot(
+        self,
+        slot: ImageSlot,
+        business_context: str,
+        model: str,
+        enhanced_prompt: Optional[str] = None
+    ) -> GeneratedImage:
+        """Enhance and generate a single slot, falling back to a placeholder"""
+
+        try:
+            # Enhance prompt using GPT-5 (unless the batch call already did)
+            if enhanced_prompt is None:
+                enhanced_prompt = await self._enhance_prompt(slot, business_context)
+
+            # Generate image via Replicate
+            image_url = await self._generate_single_image(enhanced_prompt, model)
+
+            if image_url:
+                return GeneratedImage(
+                    role=slot.role,
+                    url=image_url,
+                    prompt_used=enhanced_prompt,
+                    style_applied=str(slot.styleHints)
+                )
+
+            # Fallback to placeholder
+            return self._create_placeholder_image(slot)
+
+        except Exception as e:
+            print(f"Failed to generate image for {slot.role}: {e}")
+            return self._create_placeholder_image(slot)
+
+    async def _enhance_prompt(self, slot: ImageSlot, business_context: str) -> str:
+        """Enhance image prompt using GPT-5"""
+        
+        try:
+            async with self._llm_sem:
+                response = await self._retry(lambda: self._fast_llm.ainvoke(
+                    self.prompt_enhancement_template.format(
+                        base_prompt=slot.prompt,
+                        style_hints=slot.styleHints,
+                        business_context=business_context
+                    )
+                ))
             return response.content.strip()
         except Exception as e:
             print(f"Failed to enhance prompt: {e}")
@@ -122,9 +280,11 @@ class ImageAgent:
     async def _generate_single_image(self, prompt: str, model: str) -> Optional[str]:
         """Generate single image via Replicate"""
         
-        try:
-            # Use SDXL for high-quality results
-            output = self.replicate_client.run(
+        def _run_replicate():
+            # Use SDXL for high-quality results. async_run drives the
+            # prediction on the client's shared connection pool without
+            # blocking the event loop for the other concurrent slots
+            return self.replicate_client.async_run(
                 model,
                 input={
                     "prompt": prompt,
@@ -136,6 +296,10 @@ class ImageAgent:
                     "guidance_scale": 7.5
                 }
             )
+
+        try:
+            async with self._replicate_sem:
+                output = await self._retry(_run_replicate)
             
             if output and len(output) > 0:
                 return output[0]  # Return first generated image URL
@@ -146,6 +310,96 @@ class ImageAgent:
         
         return None
     
+    @staticmethod
+    def _batch_prompt(slot: ImageSlot, business_context: str) -> str:
+        """Build the DALL-E prompt for a slot; shared by submit and collect"""
+        return ", ".join(filter(None, (
+            slot.prompt,
+            business_context,
+            "professional commercial photography, clean composition"
+        )))
+
+    def submit_images_batch(
+        self,
+        image_slots: List[ImageSlot],
+        business_context: str = "",
+        completion_window: str = "24h"
+    ) -> str:
+        """Submit all slot prompts as one OpenAI Batch image job.
+
+        Batch requests cost half of the synchronous API at the price of
+        up-to-24h turnaround, which suits offline site generation where
+        nobody is watching a progress bar; interactive flows stay on the
+        Replicate path. Slot roles must be unique per job since they serve
+        as the custom_id. Returns the batch id to poll with
+        collect_images_batch.
+        """
+        lines = []
+        for slot in image_slots:
+            lines.append(json.dumps({
+                "custom_id": slot.role,
+                "method": "POST",
+                "url": "/v1/images/generations",
+                "body": {
+                    "model": "dall-e-3",
+                    "prompt": self._batch_prompt(slot, business_context),
+                    "n": 1,
+                    "size": "1792x1024"  # Closest DALL-E size to the 16:9 hero crop
+                }
+            }))
+
+        client = OpenAI()
+        batch_file = client.files.create(
+            file=io.BytesIO("\n".join(lines).encode()),
+            purpose="batch"
+        )
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/images/generations",
+            completion_window=completion_window
+        )
+        return batch.id
+
+    def collect_images_batch(
+        self,
+        batch_id: str,
+        image_slots: List[ImageSlot],
+        business_context: str = ""
+    ) -> Optional[List[GeneratedImage]]:
+        """Fetch a finished batch job and build one GeneratedImage per slot.
+
+        Returns None while the job is still running; slots whose response
+        is missing or failed fall back to placeholders, like the sync path.
+        """
+        client = OpenAI()
+        batch = client.batches.retrieve(batch_id)
+        if batch.status != "completed":
+            return None
+
+        urls: Dict[str, str] = {}
+        output = client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            data = (record.get("response") or {}).get("body", {}).get("data") or []
+            if data and data[0].get("url"):
+                urls[record["custom_id"]] = data[0]["url"]
+
+        images = []
+        for slot in image_slots:
+            url = urls.get(slot.role)
+            if url:
+                images.append(GeneratedImage(
+                    role=slot.role,
+                    url=url,
+                    prompt_used=self._batch_prompt(slot, business_context),
+                    style_applied="batch"
+                ))
+            else:
+                images.append(self._create_placeholder_image(slot))
+        return images
+
     def _generate_placeholder_images(self, image_slots: List[ImageSlot]) -> List[GeneratedImage]:
         """Generate placeholder images when Replicate is not available"""
         
@@ -160,16 +414,7 @@ class ImageAgent:
     def _create_placeholder_image(self, slot: ImageSlot) -> GeneratedImage:
         """Create placeholder image for slot"""
         
-        # Use different placeholder services based on role
-        placeholder_urls = {
-            "hero": "https://images.unsplash.com/photo-1559757148-5c350d0d3c56?w=800&h=600&fit=crop&crop=center",  # Medical facility
-            "logo": "https://via.placeholder.com/200x80/2563EB/FFFFFF?text=LOGO",
-            "team": "https://images.unsplash.com/photo-1612349317150-e413f6a5b16d?w=800&h=600&fit=crop&crop=center",  # Medical team
-            "service": "https://images.unsplash.com/photo-1576091160399-112ba8d25d1f?w=800&h=600&fit=crop&crop=center",  # Medical equipment
-            "about": "https://images.unsplash.com/photo-1519494026892-80bbd2d6fd0d?w=800&h=600&fit=crop&crop=center"   # Modern medical building
-        }
-        
-        placeholder_url = placeholder_urls.get(slot.role, "https://via.placeholder.com/800x600/CCCCCC/666666?text=Image")
+        placeholder_url = _PLACEHOLDER_URLS.get(slot.role, _FALLBACK_PLACEHOLDER_URL)
         
         return GeneratedImage(
             role=slot.role,
@@ -186,10 +431,10 @@ class ImageAgent:
     ) -> GeneratedImage:
         """Regenerate single image with variations"""
         
-        # Apply style variations to the prompt
-        modified_slot = slot.copy()
-        if style_variations:
-            modified_slot.styleHints.update(style_variations)
+        # Apply style variations without mutating the caller's slot (the
+        # shallow copy + in-place update shared the original styleHints dict)
+        merged_hints = {**slot.styleHints, **(style_variations or {})}
+        modified_slot = slot.model_copy(update={"styleHints": merged_hints})
         
         # Generate new image
         generated_images = await self.generate_images([modified_slot], business_context)
@@ -199,13 +444,9 @@ class ImageAgent:
     def get_supported_styles(self) -> Dict[str, List[str]]:
         """Get available style options for image generation"""
         
-        return {
-            "mood": ["professional", "warm", "modern", "luxurious", "clinical", "welcoming"],
-            "lighting": ["natural", "soft", "bright", "dramatic", "ambient"],
-            "composition": ["centered", "rule-of-thirds", "wide-angle", "close-up", "environmental"],
-            "color_palette": ["neutral", "blue-medical", "green-wellness", "warm-tones", "high-contrast"],
-            "photography_style": ["commercial", "lifestyle", "clinical", "architectural", "portrait"]
-        }
+        # Fresh lists so callers can mutate their copy without touching the
+        # shared constant
+        return {key: list(values) for key, values in _SUPPORTED_STYLES.items()}
     
     def estimate_generation_time(self, num_images: int) -> Dict[str, Any]:
         """Estimate time and cost for image generation"""
@@ -0,0 +1,90 @@
+"""
+Shared JSON extraction helpers for LLM responses
+"""
+
+import json
+import re
+
+try:
+    import orjson
+    def loads(text):
+        """orjson-backed json.loads; raises ValueError on bad input"""
+        return orjson.loads(text)
+except ImportError:  # pragma: no cover - orjson is in requirements
+    def loads(text):
+        """Stdlib fallback for environments without orjson"""
+        return json.loads(text)
+
+# Only applied after a parse failure; trims trailing commas before } or ]
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+
+
+def _extract_json_block(text: str) -> str:
+    """Slice the first balanced JSON object/array out of text in one pass.
+
+    Walks the string once, tracking brace/bracket depth and string state
+    (so braces inside string values don't confuse the count), instead of
+    running several regex scans over the same multi-KB response.
+    """
+    start = -1
+    depth = 0
+    in_string = False
+    escaped = False
+    closer_for = {'{': '}', '[': ']'}
+    opener = ''
+
+    for i, ch in enumerate(text):
+        if start == -1:
+            if ch in closer_for:
+                start = i
+                opener = ch
+                depth = 1
+            continue
+        if escaped:
+            escaped = False
+            continue
+        if ch == '\\':
+            escaped = in_string
+            continue
+        if ch == '"':
+            in_string = not in_string
+            continue
+        if in_string:
+            continue
+        if ch == opener:
+            depth += 1
+        elif ch == closer_for[opener]:
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+
+    return text
+
+
+def extract_json_from_text(text: str) -> str:
+    """Extract a JSON payload from an LLM response.
+
+    Tries the raw stripped string first - the common case with
+    instruction-tuned models returning pristine JSON - then slices out
+    the first balanced JSON block (which also handles markdown code
+    fences, since the fence markers sit outside the braces), repairing
+    trailing commas only if the block still fails to parse.
+    """
+    candidate = text.strip()
+    try:
+        loads(candidate)
+        return candidate
+    except ValueError:
+        pass
+
+    block = _extract_json_block(candidate)
+    try:
+        loads(block)
+        return block
+    except ValueError:
+        repaired = _TRAILING_COMMA_RE.sub(r'\1', block)
+        try:
+            loads(repaired)
+            return repaired
+        except ValueError:
+            return block
@@ -3,38 +3,126 @@ Planner Agent - Creates PageSpec from Brief + DesignSystem
 Specialized for Growth99 healthcare layouts
 """
 
-from typing import Dict, Any, List, Optional
-from pydantic import BaseModel
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from pydantic import BaseModel, ConfigDict
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
+import asyncio
+import hashlib
+import io
+import json
+from openai import OpenAI
 from .requirements_agent import Brief
 from .reference_agent import DesignSystem
+from .json_utils import extract_json_from_text, loads
 
+# Specs are read-only once planned (and cached/shared across requests), so
+# freeze them and drop stray LLM keys instead of carrying them around;
+# same config as the composer's node models
 class Section(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+
     type: str
     props: Dict[str, Any]
 
 class PageSpec(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+
     pageName: str
     sections: List[Section]
     assets: Dict[str, str]
 
-class PlannerAgent:
-    def __init__(self, llm_client: ChatOpenAI):
-        self.llm = llm_client
-        
-        self.planning_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a page layout planner for Growth99 healthcare websites.
+# The extraction schema example is ~1KB of static text. Keeping it as one
+# stable module-level constant (rather than re-interpolating it per call)
+# means the request prefix is byte-identical across invocations, which is
+# what lets OpenAI's automatic prompt caching hit on the system block
+_EXTRACTION_SYSTEM = """Extract a structured page specification from the layout plan.
+
+            Return ONLY a JSON object with this exact structure:
+            {{
+                "pageName": "Page Name",
+                "sections": [
+                    {{
+                        "type": "Header",
+                        "props": {{
+                            "logo": true,
+                            "nav": ["Home", "Services", "About", "Contact"],
+                            "phone": "+1 (555) 123-4567",
+                            "cta": "Book Now"
+                        }}
+                    }},
+                    {{
+                        "type": "Hero",
+                        "props": {{
+                            "title": "Main Headline",
+                            "subtitle": "Supporting text",
+                            "cta": "Primary Button",
+                            "ctaSecondary": "Secondary Button",
+                            "imageSlot": "hero",
+                            "variant": "split|centered|fullwidth"
+                        }}
+                    }}
+                ],
+                "assets": {{
+                    "logo": "logo",
+                    "hero": "hero",
+                    "about": "team"
+                }}
+            }}
+
+            Use healthcare-appropriate copy and CTAs."""
+
+# Static fallback data for _get_default_page_spec / _get_hero_title, hoisted
+# so the fallback path doesn't re-literal the same dicts on every call.
+# Brief-dependent sections are still built per call; these never vary
+_HERO_TITLES = {
+    "medical spa": "Transform Your Skin, Elevate Your Confidence",
+    "med-spa": "Advanced Aesthetics, Personalized Care",
+    "dental": "Your Smile, Our Expertise",
+    "wellness": "Holistic Health, Lasting Wellness",
+    "clinic": "Comprehensive Care, Exceptional Results",
+    "hospital": "Advanced Medicine, Compassionate Care",
+    "dermatology": "Healthy Skin, Expert Care",
+    "plastic surgery": "Artistry Meets Medicine"
+}
+
+_DEFAULT_HERO_TITLE = "Expert Healthcare, Personalized for You"
+
+_TESTIMONIALS_SECTION = {
+    "type": "Testimonials",
+    "props": {
+        "title": "What Our Patients Say",
+        "testimonials": [
+            {
+                "quote": "Outstanding care and results. Highly recommend!",
+                "author": "Sarah M.",
+                "rating": 5
+            },
+            {
+                "quote": "Professional staff and excellent service.",
+                "author": "Michael R.",
+                "rating": 5
+            }
+        ]
+    }
+}
+
+# Templates are parsed once at import and shared across agent instances;
+# per-request construction re-parsed the ~3KB system message each time and
+# broke object-identity-keyed caching in LangChain callbacks
+_PLANNING_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a page layout planner for Growth99 healthcare websites.
 
             Create detailed page specifications that will be rendered in Figma.
-            
+
             HEALTHCARE LAYOUT PRINCIPLES:
             1. Trust & Credibility First - Professional header, certifications visible
             2. Clear Value Proposition - Hero section with primary service/benefit
             3. Social Proof - Testimonials, before/after, credentials
             4. Service Clarity - Clear service descriptions with benefits
             5. Easy Action - Prominent, clear call-to-action buttons
-            
+
             AVAILABLE SECTION TYPES:
             - Header: Logo, navigation, contact info
             - Hero: Main headline, subtitle, CTA, hero image/video
@@ -47,12 +135,12 @@ class PlannerAgent:
             - FAQ: Common questions
             - Contact: Location, hours, booking
             - Footer: Links, contact, legal
-            
+
             Consider the business type, target audience, and brand tone.
             Plan sections that build trust and drive conversions.
-            
+
             Return a complete page specification with detailed props for each section."""),
-            ("human", """Create a page layout for:
+    ("human", """Create a page layout for:
 
 Business Brief:
 {brief}
@@ -62,7 +150,44 @@ Design System:
 
 Page Type: {page_type}
 Special Requirements: {requirements}""")
-        ])
+])
+
+_EXTRACTION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", _EXTRACTION_SYSTEM),
+    ("human", "Layout plan to extract:\n{llm_response}\n\nBusiness type: {business_type}")
+])
+
+_FOOTER_SECTION = {
+    "type": "Footer",
+    "props": {
+        "logo": True,
+        "address": "123 Medical Plaza, City, ST 12345",
+        "phone": "+1 (555) 123-4567",
+        "email": "info@practice.com",
+        "hours": {
+            "Mon-Fri": "9:00 AM - 6:00 PM",
+            "Sat": "9:00 AM - 3:00 PM",
+            "Sun": "Closed"
+        },
+        "social": ["facebook", "instagram", "twitter"]
+    }
+}
+
+# Healthcare verticals are a narrow domain, so briefs from different users
+# frequently normalize to the same planning inputs; cap the cache so
+# long-lived processes don't grow unbounded
+_SPEC_CACHE_SIZE = 256
+
+class PlannerAgent:
+    planning_prompt = _PLANNING_PROMPT
+    extraction_prompt = _EXTRACTION_PROMPT
+
+    def __init__(self, llm_client: ChatOpenAI):
+        self.llm = llm_client
+        # One round-trip straight to a validated PageSpec via tool calling;
+        # the two-call plan-then-extract path remains as the fallback
+        self.structured_llm = llm_client.with_structured_output(PageSpec, method="function_calling")
+        self._spec_cache: OrderedDict[str, PageSpec] = OrderedDict()
 
     async def create_page_spec(
         self, 
@@ -74,26 +199,178 @@ Special Requirements: {requirements}""")
     ) -> PageSpec:
         """Create page specification from brief and design system"""
         
+        # Briefs for the same vertical normalize to the same planning
+        # inputs, so serve repeats from the LRU cache - but only when the
+        # LLM is deterministic, otherwise we'd freeze one sample forever
+        cache_key = None
+        if not getattr(self.llm, "temperature", 0):
+            cache_key = self._spec_cache_key(brief, page_type, special_requirements)
+            cached = self._spec_cache.get(cache_key)
+            if cached is not None:
+                self._spec_cache.move_to_end(cache_key)
+                return cached
+
         # Format inputs for prompt
         brief_text = self._format_brief(brief)
         design_text = self._format_design_system(design_system)
         requirements_text = special_requirements or "None"
-        
-        # Generate page specification
-        response = await self.llm.ainvoke(
-            self.planning_prompt.format(
-                brief=brief_text,
-                design_system=design_text,
+
+        prompt = self.planning_prompt.format(
+            brief=brief_text,
+            design_system=design_text,
+            page_type=page_type,
+            requirements=requirements_text
+        )
+
+        # Structured output yields the PageSpec in a single round-trip
+        # instead of planning prose and re-extracting JSON from it
+        try:
+            spec = await self.structured_llm.ainvoke(prompt)
+        except Exception as e:
+            print(f"Structured page planning failed: {e}")
+            # Fallback: original two-stage plan-then-extract path. Stream
+            # the plan so the full response isn't buffered inside the
+            # client before we can look at it
+            chunks = []
+            async for chunk in self.llm.astream(prompt):
+                chunks.append(chunk.content)
+            page_spec_data = await self._parse_page_spec("".join(chunks), brief, page_type)
+            spec = PageSpec(**page_spec_data)
+
+        if cache_key is not None:
+            self._cache_spec(cache_key, spec)
+        return spec
+
+    def submit_page_specs_batch(
+        self,
+        items: List[Tuple[Brief, DesignSystem, str]],
+        completion_window: str = "24h"
+    ) -> str:
+        """Submit a whole site's planner prompts as one OpenAI Batch job.
+
+        Batch requests cost half of the synchronous API at the price of
+        up-to-24h turnaround, which suits offline site generation; keep
+        interactive flows on create_page_specs_batch. Page types must be
+        unique per job since they serve as the custom_id. Returns the
+        batch id to poll with collect_page_specs_batch.
+        """
+        model_name = getattr(self.llm, "model_name", "gpt-4")
+        lines = []
+        for brief, design_system, page_type in items:
+            messages = self.planning_prompt.format_messages(
+                brief=self._format_brief(brief),
+                design_system=self._format_design_system(design_system),
                 page_type=page_type,
-                requirements=requirements_text
+                requirements="None"
             )
+            role_for = {"system": "system", "human": "user"}
+            lines.append(json.dumps({
+                "custom_id": page_type,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model_name,
+                    "messages": [
+                        {"role": role_for.get(m.type, "user"), "content": m.content}
+                        for m in messages
+                    ]
+                }
+            }))
+
+        client = OpenAI()
+        batch_file = client.files.create(
+            file=io.BytesIO("\n".join(lines).encode()),
+            purpose="batch"
         )
-        
-        # Parse response into structured PageSpec
-        page_spec_data = self._parse_page_spec(response.content, brief, page_type)
-        
-        return PageSpec(**page_spec_data)
-    
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=completion_window
+        )
+        return batch.id
+
+    async def collect_page_specs_batch(
+        self,
+        batch_id: str,
+        items: List[Tuple[Brief, DesignSystem, str]]
+    ) -> Optional[Dict[str, PageSpec]]:
+        """Fetch a finished batch job and parse one PageSpec per page.
+
+        Returns None while the job is still running; pages whose response
+        fails to parse fall back to the default spec, like the sync path.
+        """
+        client = OpenAI()
+        batch = client.batches.retrieve(batch_id)
+        if batch.status != "completed":
+            return None
+
+        briefs_by_page = {page_type: brief for brief, _, page_type in items}
+        specs: Dict[str, PageSpec] = {}
+        output = client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            page_type = record["custom_id"]
+            brief = briefs_by_page.get(page_type)
+            if brief is None:
+                continue
+            content = record["response"]["body"]["choices"][0]["message"]["content"]
+            spec_data = await self._parse_page_spec(content, brief, page_type)
+            specs[page_type] = PageSpec(**spec_data)
+        return specs
+
+    def _spec_cache_key(self, brief: Brief, page_type: str, special_requirements: Optional[str]) -> str:
+        """Stable hash of the planning inputs that shape the spec"""
+        payload = json.dumps({
+            "ind": brief.industry.lower(),
+            "bt": brief.business_type.lower(),
+            "pt": page_type,
+            "svc": sorted(brief.key_services),
+            "cta": brief.primary_cta,
+            "req": special_requirements or ""
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _cache_spec(self, cache_key: str, spec: PageSpec) -> None:
+        """Store a planned spec, evicting the least recently used entry"""
+        self._spec_cache[cache_key] = spec
+        self._spec_cache.move_to_end(cache_key)
+        if len(self._spec_cache) > _SPEC_CACHE_SIZE:
+            self._spec_cache.popitem(last=False)
+
+    async def create_page_specs_batch(
+        self,
+        items: List[Tuple[Brief, DesignSystem, str]],
+        max_concurrency: int = 4
+    ) -> List[PageSpec]:
+        """Create specs for several pages concurrently.
+
+        Each item is (brief, design_system, page_type). The plan+extract
+        chains are network-bound, so running them together collapses the
+        wall-clock cost from the sum of pages to roughly one page; the
+        semaphore keeps the fan-out within provider rate limits.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _bounded(brief: Brief, design_system: DesignSystem, page_type: str):
+            async with semaphore:
+                return await self.create_page_spec(brief, design_system, page_type)
+
+        results = await asyncio.gather(
+            *[_bounded(brief, ds, page_type) for brief, ds, page_type in items],
+            return_exceptions=True
+        )
+
+        specs = []
+        for (brief, _, page_type), result in zip(items, results):
+            if isinstance(result, Exception):
+                print(f"Failed to plan {page_type} page: {result}")
+                specs.append(PageSpec(**self._get_default_page_spec(brief, page_type)))
+            else:
+                specs.append(result)
+        return specs
+
     def _format_brief(self, brief: Brief) -> str:
         """Format brief for prompt context"""
         return f"""
@@ -117,52 +394,28 @@ Button Style: {design_system.components.get('Button', {})}
 Spacing Scale: {design_system.spacingScale[:5]}
 """
     
-    def _parse_page_spec(self, llm_response: str, brief: Brief, page_type: str) -> Dict[str, Any]:
+    async def _parse_page_spec(self, llm_response: str, brief: Brief, page_type: str) -> Dict[str, Any]:
         """Parse LLM response into structured PageSpec"""
-        
-        extraction_prompt = ChatPromptTemplate.from_messages([
-            ("system", """Extract a structured page specification from the layout plan.
-            
-            Return ONLY a JSON object with this exact structure:
-            {
-                "pageName": "Page Name",
-                "sections": [
-                    {
-                        "type": "Header",
-                        "props": {
-                            "logo": true,
-                            "nav": ["Home", "Services", "About", "Contact"],
-                            "phone": "+1 (555) 123-4567",
-                            "cta": "Book Now"
-                        }
-                    },
-                    {
-                        "type": "Hero", 
-                        "props": {
-                            "title": "Main Headline",
-                            "subtitle": "Supporting text",
-                            "cta": "Primary Button",
-                            "ctaSecondary": "Secondary Button",
-                            "imageSlot": "hero",
-                            "variant": "split|centered|fullwidth"
-                        }
-                    }
-                ],
-                "assets": {
-                    "logo": "logo",
-                    "hero": "hero",
-                    "about": "team"
-                }
-            }
-            
-            Use healthcare-appropriate copy and CTAs."""),
-            ("human", f"Layout plan to extract:\n{llm_response}\n\nBusiness type: {brief.business_type}")
-        ])
-        
+
+        # Fast path: if the plan itself is already the JSON spec (common
+        # with instruction-tuned models), skip the extraction round-trip
+        try:
+            data = loads(extract_json_from_text(llm_response))
+            if isinstance(data, dict) and "sections" in data:
+                return data
+        except ValueError:
+            pass
+
         try:
-            extraction_response = self.llm.invoke(extraction_prompt)
-            import json
-            return json.loads(extraction_response.content)
+            # ainvoke keeps extraction on the event loop so batched pages
+            # can overlap instead of serializing on a sync call
+            extraction_response = await self.llm.ainvoke(
+                self.extraction_prompt.format(
+                    llm_response=llm_response,
+                    business_type=brief.business_type
+                )
+            )
+            return loads(extract_json_from_text(extraction_response.content))
         except Exception as e:
             print(f"Failed to parse page spec: {e}")
             return self._get_default_page_spec(brief, page_type)
@@ -222,25 +475,8 @@ Spacing Scale: {design_system.spacingScale[:5]}
             }
         })
         
-        # Testimonials
-        sections.append({
-            "type": "Testimonials", 
-            "props": {
-                "title": "What Our Patients Say",
-                "testimonials": [
-                    {
-                        "quote": "Outstanding care and results. Highly recommend!",
-                        "author": "Sarah M.",
-                        "rating": 5
-                    },
-                    {
-                        "quote": "Professional staff and excellent service.",
-                        "author": "Michael R.", 
-                        "rating": 5
-                    }
-                ]
-            }
-        })
+        # Testimonials (static copy; Section validation takes its own copy)
+        sections.append(_TESTIMONIALS_SECTION)
         
         # CTA section
         sections.append({
@@ -254,21 +490,7 @@ Spacing Scale: {design_system.spacingScale[:5]}
         })
         
         # Footer
-        sections.append({
-            "type": "Footer",
-            "props": {
-                "logo": True,
-                "address": "123 Medical Plaza, City, ST 12345",
-                "phone": "+1 (555) 123-4567",
-                "email": "info@practice.com",
-                "hours": {
-                    "Mon-Fri": "9:00 AM - 6:00 PM",
-                    "Sat": "9:00 AM - 3:00 PM",
-                    "Sun": "Closed"
-                },
-                "social": ["facebook", "instagram", "twitter"]
-            }
-        })
+        sections.append(_FOOTER_SECTION)
         
         return {
             "pageName": f"{page_type} - {brief.business_type.title()}",
@@ -282,15 +504,4 @@ Spacing Scale: {design_system.spacingScale[:5]}
     
     def _get_hero_title(self, business_type: str) -> str:
         """Generate appropriate hero title for business type"""
-        titles = {
-            "medical spa": "Transform Your Skin, Elevate Your Confidence",
-            "med-spa": "Advanced Aesthetics, Personalized Care", 
-            "dental": "Your Smile, Our Expertise",
-            "wellness": "Holistic Health, Lasting Wellness",
-            "clinic": "Comprehensive Care, Exceptional Results",
-            "hospital": "Advanced Medicine, Compassionate Care",
-            "dermatology": "Healthy Skin, Expert Care",
-            "plastic surgery": "Artistry Meets Medicine"
-        }
-        
-        return titles.get(business_type.lower(), "Expert Healthcare, Personalized for You")
\ No newline at end of file
+        return _HERO_TITLES.get(business_type.lower(), _DEFAULT_HERO_TITLE)
\ No newline at end of file
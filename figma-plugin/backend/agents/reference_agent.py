@@ -3,13 +3,52 @@ Reference Agent - Analyzes URLs using Firecrawl and extracts design systems
 """
 
 from typing import Dict, Any, List, Optional
-from pydantic import BaseModel
+from collections import OrderedDict
+from pydantic import BaseModel, ConfigDict
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
+import asyncio
+import hashlib
+import io
+import json
+import logging
 import os
-from firecrawl import FirecrawlApp
+import time
+import types
+import httpx
+from urllib.parse import urlparse
+from .json_utils import extract_json_from_text, loads
+
+logger = logging.getLogger(__name__)
+
+# Repeat analyses of the same URLs/brief are common while users iterate;
+# cap the cache so long-lived processes don't grow unbounded
+_ANALYSIS_CACHE_SIZE = 64
+
+# Per-URL content budget; bounds both peak memory and LLM context length
+_MAX_CONTENT_CHARS = 20_000
+
+# Scraped pages change rarely within a working session; reuse them for an
+# hour before paying the Firecrawl round-trip again
+_URL_CACHE_TTL = 3600.0
+
+# Each cached scrape holds a full page's markdown and the keys are
+# user-supplied URLs, so the cache is bounded like the analysis LRU
+_URL_CACHE_SIZE = 128
+
+# Optional prebaked index of netloc -> design-system data for well-known
+# Growth99 reference sites, letting analyze_references skip Firecrawl and
+# the LLM entirely when every requested URL is already indexed
+_PREBAKED_INDEX_PATH = os.getenv(
+    "PREBAKED_DESIGN_INDEX",
+    os.path.join(os.path.dirname(__file__), "prebaked_design_systems.json")
+)
 
 class DesignSystem(BaseModel):
+    # Instances are shared read-only between agents; freezing makes that
+    # explicit, and ignoring extras skips validation of LLM-output noise
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     colors: Dict[str, str]
     typography: Dict[str, Any] 
     spacingScale: List[int]
@@ -18,171 +57,318 @@ class DesignSystem(BaseModel):
     components: Dict[str, Any]
     confidence: float = 0.8
 
-class ReferenceAgent:
-    def __init__(self, llm_client: ChatOpenAI):
-        self.llm = llm_client
-        self.firecrawl = FirecrawlApp(api_key=os.getenv("FIRECRAWL_API_KEY")) if os.getenv("FIRECRAWL_API_KEY") else None
-        
-        self.analysis_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a design system analyst for Growth99 healthcare websites.
-            
+def _load_prebaked_index() -> Dict[str, DesignSystem]:
+    """Load the netloc -> DesignSystem index, empty if absent or invalid"""
+    if not os.path.exists(_PREBAKED_INDEX_PATH):
+        return {}
+    try:
+        with open(_PREBAKED_INDEX_PATH, "rb") as fh:
+            raw = loads(fh.read())
+        return {netloc: DesignSystem(**data) for netloc, data in raw.items()}
+    except (ValueError, TypeError) as e:
+        logger.warning("Ignoring invalid prebaked design index %s: %s",
+                       _PREBAKED_INDEX_PATH, e)
+        return {}
+
+_PREBAKED = _load_prebaked_index()
+
+# Templates are parsed once at import and shared across agent instances
+# instead of being rebuilt in every __init__ / per parse call
+_ANALYSIS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a design system analyst for Growth99 healthcare websites.
+
             Analyze the provided website content and extract design system tokens:
-            
+
             1. COLOR PALETTE:
                - Primary brand colors (usually 2-3 main colors)
                - Text colors (headings, body, muted)
                - Background colors
                - Accent colors for CTAs
-            
+
             2. TYPOGRAPHY:
                - Font families used
                - Heading hierarchy (sizes, weights)
                - Body text specifications
                - Letter spacing, line heights
-            
+
             3. SPACING & LAYOUT:
                - Common spacing values (8px, 16px, 24px, etc.)
                - Container widths
                - Grid systems
                - Section padding patterns
-            
+
             4. UI COMPONENTS:
                - Button styles (radius, padding, hover states)
                - Card designs
                - Navigation patterns
                - Form elements
-            
+
             Focus on healthcare/medical aesthetics: clean, trustworthy, professional.
-            
+
             Return a structured design system that can be applied to new pages."""),
-            ("human", "Website content to analyze:\n{website_content}")
-        ])
+    ("human", "Website content to analyze:\n{website_content}")
+])
 
-    async def analyze_references(self, urls: List[str], brief_context: str = "") -> DesignSystem:
-        """Analyze reference URLs and extract design system"""
-        
-        if not urls:
-            return self._get_default_healthcare_design_system()
-        
-        # Scrape URLs using Firecrawl
-        scraped_content = []
-        for url in urls:
-            try:
-                if self.firecrawl:
-                    result = self.firecrawl.scrape_url(url, {
-                        'formats': ['markdown'],
-                        'includeTags': ['style', 'link'],
-                        'excludeTags': ['script'],
-                    })
-                    scraped_content.append({
-                        'url': url,
-                        'content': result.get('markdown', ''),
-                        'metadata': result.get('metadata', {})
-                    })
-                else:
-                    # Fallback without Firecrawl
-                    scraped_content.append({
-                        'url': url,
-                        'content': f"URL: {url} (Firecrawl not configured)",
-                        'metadata': {}
-                    })
-            except Exception as e:
-                print(f"Failed to scrape {url}: {e}")
-                continue
-        
-        if not scraped_content:
-            return self._get_default_healthcare_design_system()
-        
-        # Combine content for analysis
-        combined_content = "\n\n".join([
-            f"URL: {item['url']}\n{item['content']}" for item in scraped_content
-        ])
-        
-        # Add brief context for better analysis
-        if brief_context:
-            combined_content = f"Target business context: {brief_context}\n\n{combined_content}"
-        
-        # Analyze with GPT-5
-        response = await self.llm.ainvoke(
-            self.analysis_prompt.format(website_content=combined_content)
-        )
-        
-        # Parse into design system
-        design_system_data = self._parse_design_system(response.content)
-        
-        return DesignSystem(**design_system_data)
-    
-    def _parse_design_system(self, llm_response: str) -> Dict[str, Any]:
-        """Parse LLM response into structured design system"""
-        
-        extraction_prompt = ChatPromptTemplate.from_messages([
-            ("system", """Extract a structured design system from the analysis.
+_EXTRACTION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """Extract a structured design system from the analysis.
             Return ONLY a JSON object with this exact structure:
-            {
-                "colors": {
+            {{
+                "colors": {{
                     "primary": "#hexcode",
-                    "secondary": "#hexcode", 
+                    "secondary": "#hexcode",
                     "text": "#hexcode",
                     "textMuted": "#hexcode",
                     "background": "#hexcode",
                     "accent": "#hexcode"
-                },
-                "typography": {
-                    "display": {"family": "Font Name", "size": 44, "weight": "700", "lineHeight": 1.2},
-                    "h1": {"family": "Font Name", "size": 36, "weight": "700"},
-                    "h2": {"family": "Font Name", "size": 28, "weight": "600"},
-                    "h3": {"family": "Font Name", "size": 24, "weight": "600"},
-                    "body": {"family": "Font Name", "size": 16, "lineHeight": 1.5, "weight": "400"},
-                    "small": {"size": 14, "lineHeight": 1.4}
-                },
+                }},
+                "typography": {{
+                    "display": {{"family": "Font Name", "size": 44, "weight": "700", "lineHeight": 1.2}},
+                    "h1": {{"family": "Font Name", "size": 36, "weight": "700"}},
+                    "h2": {{"family": "Font Name", "size": 28, "weight": "600"}},
+                    "h3": {{"family": "Font Name", "size": 24, "weight": "600"}},
+                    "body": {{"family": "Font Name", "size": 16, "lineHeight": 1.5, "weight": "400"}},
+                    "small": {{"size": 14, "lineHeight": 1.4}}
+                }},
                 "spacingScale": [8, 12, 16, 24, 32, 48, 64, 96],
-                "radius": {"sm": 4, "md": 8, "lg": 12, "xl": 16},
-                "grid": {"container": 1200, "columns": 12, "gutter": 24},
-                "components": {
-                    "Button": {"radius": 8, "padX": 24, "padY": 12, "weight": "600"},
-                    "Card": {"radius": 12, "shadow": "0 4px 12px rgba(0,0,0,0.1)", "padding": 24}
-                },
+                "radius": {{"sm": 4, "md": 8, "lg": 12, "xl": 16}},
+                "grid": {{"container": 1200, "columns": 12, "gutter": 24}},
+                "components": {{
+                    "Button": {{"radius": 8, "padX": 24, "padY": 12, "weight": "600"}},
+                    "Card": {{"radius": 12, "shadow": "0 4px 12px rgba(0,0,0,0.1)", "padding": 24}}
+                }},
                 "confidence": 0.8
-            }"""),
-            ("human", f"Design analysis to extract:\n{llm_response}")
-        ])
-        
+            }}"""),
+    ("human", "Design analysis to extract:\n{llm_response}")
+])
+
+class ReferenceAgent:
+    analysis_prompt = _ANALYSIS_PROMPT
+    extraction_prompt = _EXTRACTION_PROMPT
+
+    def __init__(self, llm_client: ChatOpenAI):
+        self.llm = llm_client
+        # Call Firecrawl's REST API on a pooled async client: concurrent
+        # scrapes share keepalive connections instead of each paying
+        # TCP+TLS setup through the blocking SDK on a worker thread
+        api_key = os.getenv("FIRECRAWL_API_KEY")
+        self._http = httpx.AsyncClient(
+            base_url="https://api.firecrawl.dev",
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=30,
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20)
+        ) if api_key else None
+        self._analysis_cache: OrderedDict[str, DesignSystem] = OrderedDict()
+        # Scrapes run concurrently; the semaphore keeps the fan-out below
+        # Firecrawl's rate limits
+        self._scrape_sem = asyncio.Semaphore(8)
+        self._url_cache: OrderedDict[str, tuple] = OrderedDict()
+
+    async def analyze_references(self, urls: List[str], brief_context: str = "") -> DesignSystem:
+        """Analyze reference URLs and extract design system"""
+
+        if not urls:
+            return self._get_default_healthcare_design_system()
+
+        # Dedupe while preserving order so repeated URLs in one request
+        # don't trigger repeated scrapes
+        urls = list(dict.fromkeys(urls))
+
+        # Well-known reference domains have stable design systems: if every
+        # URL is in the prebaked index (and no brief skews the analysis),
+        # answer directly without touching Firecrawl or the LLM
+        if _PREBAKED and not brief_context:
+            hosts = {urlparse(url).netloc for url in urls}
+            if hosts and hosts <= _PREBAKED.keys():
+                return max(
+                    (_PREBAKED[host] for host in hosts),
+                    key=lambda ds: ds.confidence
+                )
+
+        # Serve repeat analyses from the LRU cache (keyed on normalized input)
+        cache_key = self._analysis_cache_key(urls, brief_context)
+        cached = self._analysis_cache.get(cache_key)
+        if cached is not None:
+            self._analysis_cache.move_to_end(cache_key)
+            return cached
+
+        # Scrape URLs using Firecrawl. Each scrape is a multi-second HTTP
+        # round-trip, so run them concurrently, and stream each result
+        # straight into one buffer as it lands instead of holding the
+        # scraped pages twice (list of dicts plus the joined string)
+        buf = io.StringIO()
+
+        # Add brief context for better analysis
+        if brief_context:
+            buf.write(f"Target business context: {brief_context}\n\n")
+
+        scraped_any = False
+        for future in asyncio.as_completed([self._scrape_one(url) for url in urls]):
+            item = await future
+            if item is None:
+                continue
+            scraped_any = True
+            buf.write(f"URL: {item['url']}\n{item['content'][:_MAX_CONTENT_CHARS]}\n\n")
+
+        if not scraped_any:
+            return self._get_default_healthcare_design_system()
+
+        combined_content = buf.getvalue()
+
+        # Analyze with GPT-5; structured output yields the DesignSystem in a
+        # single call instead of analysis + a second extraction round-trip
+        prompt = self.analysis_prompt.format(website_content=combined_content)
         try:
-            extraction_response = self.llm.invoke(extraction_prompt)
-            import json
-            return json.loads(extraction_response.content)
+            structured_llm = self.llm.with_structured_output(DesignSystem)
+            design_system = await structured_llm.ainvoke(prompt)
         except Exception as e:
-            print(f"Failed to parse design system: {e}")
-            return self._get_default_healthcare_design_system().__dict__
+            logger.warning("Structured design-system analysis failed: %s", e)
+            # Fallback: original two-stage analyze-then-extract path
+            response = await self.llm.ainvoke(prompt)
+            design_system = await self._parse_design_system(response.content)
+
+        self._cache_analysis(cache_key, design_system)
+        return design_system
+
+    async def _scrape_one(self, url: str) -> Optional[Dict[str, Any]]:
+        """Scrape a single URL via the Firecrawl API; None on failure"""
+        if not self._http:
+            # Fallback without Firecrawl
+            return {
+                'url': url,
+                'content': f"URL: {url} (Firecrawl not configured)",
+                'metadata': {}
+            }
+        # Reuse recent scrapes of the same URL instead of paying the
+        # round-trip again while a user iterates
+        entry = self._url_cache.get(url)
+        if entry is not None:
+            if time.monotonic() - entry[0] < _URL_CACHE_TTL:
+                self._url_cache.move_to_end(url)
+                return entry[1]
+            # Expired: drop the markdown now instead of holding it until
+            # LRU eviction catches up
+            del self._url_cache[url]
+
+        try:
+            async with self._scrape_sem:
+                response = await self._http.post("/v1/scrape", json={
+                    'url': url,
+                    'formats': ['markdown'],
+                    'includeTags': ['style', 'link'],
+                    'excludeTags': ['script'],
+                })
+                response.raise_for_status()
+            result = response.json().get('data', {})
+            scraped = {
+                'url': url,
+                'content': result.get('markdown', ''),
+                'metadata': result.get('metadata', {})
+            }
+            self._url_cache[url] = (time.monotonic(), scraped)
+            self._url_cache.move_to_end(url)
+            if len(self._url_cache) > _URL_CACHE_SIZE:
+                self._url_cache.popitem(last=False)
+            return scraped
+        except Exception as e:
+            logger.warning("Failed to scrape %s: %s", url, e)
+            return None
+
+    async def aclose(self) -> None:
+        """Release the HTTP connection pool on shutdown"""
+        if self._http:
+            await self._http.aclose()
+
+    def _analysis_cache_key(self, urls: List[str], brief_context: str) -> str:
+        """Stable hash of the normalized analysis inputs"""
+        payload = json.dumps({
+            "urls": sorted(urls),
+            "brief": brief_context.strip().lower()
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _cache_analysis(self, cache_key: str, design_system: DesignSystem) -> None:
+        """Store an analysis result, evicting the least recently used entry"""
+        self._analysis_cache[cache_key] = design_system
+        self._analysis_cache.move_to_end(cache_key)
+        if len(self._analysis_cache) > _ANALYSIS_CACHE_SIZE:
+            self._analysis_cache.popitem(last=False)
+    
+    async def _parse_design_system(self, llm_response: str) -> DesignSystem:
+        """Parse LLM response into a DesignSystem model"""
+
+        # Fast path: instruction-tuned models usually return valid JSON on
+        # the first pass, making the extraction round-trip redundant.
+        # model_validate_json goes str -> model in one pydantic_core pass,
+        # skipping the intermediate dict a loads-then-validate flow builds
+        try:
+            return DesignSystem.model_validate_json(extract_json_from_text(llm_response))
+        except ValueError:
+            pass
+
+        try:
+            # Stream the extraction response so receive overlaps with the
+            # event loop's other work instead of buffering in the client
+            chunks = []
+            async for chunk in self.llm.astream(
+                self.extraction_prompt.format(llm_response=llm_response)
+            ):
+                chunks.append(chunk.content)
+            return DesignSystem.model_validate_json(extract_json_from_text("".join(chunks)))
+        except Exception as e:
+            logger.warning("Failed to parse design system: %s", e)
+            return _DEFAULT_HEALTHCARE_DESIGN_SYSTEM
     
     def _get_default_healthcare_design_system(self) -> DesignSystem:
         """Default professional healthcare design system"""
-        return DesignSystem(
-            colors={
-                "primary": "#2563EB",      # Professional blue
-                "secondary": "#059669",     # Medical green
-                "text": "#1F2937",         # Dark gray
-                "textMuted": "#6B7280",    # Medium gray
-                "background": "#FFFFFF",    # White
-                "accent": "#DC2626"        # Medical red for CTAs
-            },
-            typography={
-                "display": {"family": "Inter", "size": 44, "weight": "700", "lineHeight": 1.2},
-                "h1": {"family": "Inter", "size": 36, "weight": "700"},
-                "h2": {"family": "Inter", "size": 28, "weight": "600"},
-                "h3": {"family": "Inter", "size": 24, "weight": "600"},
-                "body": {"family": "Inter", "size": 16, "lineHeight": 1.5, "weight": "400"},
-                "small": {"size": 14, "lineHeight": 1.4}
-            },
-            spacingScale=[8, 12, 16, 24, 32, 48, 64, 96],
-            radius={"sm": 4, "md": 8, "lg": 12, "xl": 16},
-            grid={"container": 1200, "columns": 12, "gutter": 24},
-            components={
-                "Button": {"radius": 8, "padX": 24, "padY": 12, "weight": "600"},
-                "Card": {"radius": 12, "shadow": "0 4px 12px rgba(0,0,0,0.1)", "padding": 24},
-                "Nav": {"height": 80, "padding": 16},
-                "Hero": {"minHeight": 500, "padding": 64},
-                "Section": {"padding": 80}
-            },
-            confidence=0.9
-        )
\ No newline at end of file
+        return _DEFAULT_HEALTHCARE_DESIGN_SYSTEM
+
+
+# The default design system is pure data; build it once at import instead of
+# reallocating the full nested literal on every fallback. Each field lives in
+# its own read-only proxy so the shared template can't be mutated and forked
+# workers share the pages copy-on-write
+_DEFAULT_COLORS = types.MappingProxyType({
+    "primary": "#2563EB",      # Professional blue
+    "secondary": "#059669",     # Medical green
+    "text": "#1F2937",         # Dark gray
+    "textMuted": "#6B7280",    # Medium gray
+    "background": "#FFFFFF",    # White
+    "accent": "#DC2626"        # Medical red for CTAs
+})
+
+_DEFAULT_TYPOGRAPHY = types.MappingProxyType({
+    "display": {"family": "Inter", "size": 44, "weight": "700", "lineHeight": 1.2},
+    "h1": {"family": "Inter", "size": 36, "weight": "700"},
+    "h2": {"family": "Inter", "size": 28, "weight": "600"},
+    "h3": {"family": "Inter", "size": 24, "weight": "600"},
+    "body": {"family": "Inter", "size": 16, "lineHeight": 1.5, "weight": "400"},
+    "small": {"size": 14, "lineHeight": 1.4}
+})
+
+_DEFAULT_SPACING_SCALE = (8, 12, 16, 24, 32, 48, 64, 96)
+
+_DEFAULT_RADIUS = types.MappingProxyType({"sm": 4, "md": 8, "lg": 12, "xl": 16})
+
+_DEFAULT_GRID = types.MappingProxyType({"container": 1200, "columns": 12, "gutter": 24})
+
+_DEFAULT_COMPONENTS = types.MappingProxyType({
+    "Button": {"radius": 8, "padX": 24, "padY": 12, "weight": "600"},
+    "Card": {"radius": 12, "shadow": "0 4px 12px rgba(0,0,0,0.1)", "padding": 24},
+    "Nav": {"height": 80, "padding": 16},
+    "Hero": {"minHeight": 500, "padding": 64},
+    "Section": {"padding": 80}
+})
+
+# Full validation (not model_construct) on purpose: it copies the proxies
+# into plain dicts the instance owns, so downstream model_dump_json still
+# works, and the one-time import cost is irrelevant
+_DEFAULT_HEALTHCARE_DESIGN_SYSTEM = DesignSystem(
+    colors=_DEFAULT_COLORS,
+    typography=_DEFAULT_TYPOGRAPHY,
+    spacingScale=_DEFAULT_SPACING_SCALE,
+    radius=_DEFAULT_RADIUS,
+    grid=_DEFAULT_GRID,
+    components=_DEFAULT_COMPONENTS,
+    confidence=0.9
+)
\ No newline at end of file
@@ -3,13 +3,35 @@ Requirements Agent - Aggregates chat into normalized Brief
 Growth99 focus: Healthcare, medical spas, wellness clinics
 """
 
-from typing import Dict, Any, List, Optional
-from pydantic import BaseModel
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+from pydantic import BaseModel, ConfigDict
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import HumanMessage, SystemMessage
+import hashlib
+import json
+import logging
+from .json_utils import extract_json_from_text
+
+logger = logging.getLogger(__name__)
+
+# Users iterate on the same conversation, so identical chat inputs recur;
+# cap the cache so long-lived processes don't grow unbounded
+_BRIEF_CACHE_SIZE = 128
+
+# Turns kept verbatim in the prompt; older history is summarized once and
+# cached so prompt tokens stay O(MAX_TURNS) instead of growing per session
+_MAX_TURNS = 10
+_SUMMARY_CACHE_SIZE = 32
+
 
 class Brief(BaseModel):
+    # Briefs are cached and shared between requests; freezing makes that
+    # explicit, and ignoring extras skips validation of LLM-output noise
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     industry: str
     business_type: str  # med-spa, dental, wellness, etc.
     tone: str  # professional, warm, modern, etc.
@@ -20,62 +42,51 @@ class Brief(BaseModel):
     brand_personality: Optional[str] = None
     special_requirements: Optional[str] = None
 
-class RequirementsAgent:
-    def __init__(self, llm_client: ChatOpenAI):
-        self.llm = llm_client
-        self.prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a requirements analyst for Growth99, specializing in healthcare and wellness marketing websites.
-            
+# Growth99 healthcare defaults, built once at import; every parse failure
+# used to reallocate this whole literal
+_DEFAULT_BRIEF = Brief(
+    industry="healthcare",
+    business_type="medical spa",
+    tone="professional",
+    key_services=["Advanced Treatments", "Expert Care", "Personalized Service"],
+    target_audience="Health-conscious individuals seeking professional care",
+    primary_cta="Book a Free Consultation",
+    sections_requested=["Hero", "Services", "About", "Testimonials", "Contact"],
+    brand_personality="Professional, trustworthy, and caring",
+    special_requirements=None
+)
+
+# Templates are parsed once at import and shared across agent instances
+# instead of being rebuilt in every __init__ / per parse call
+_ANALYSIS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a requirements analyst for Growth99, specializing in healthcare and wellness marketing websites.
+
             Your job is to analyze chat conversations and extract a structured brief for website page generation.
-            
+
             Focus areas:
             - Medical spas, dental offices, wellness clinics, hospitals, healthcare practices
             - Professional yet approachable tone
             - Trust-building elements (certifications, testimonials, expertise)
             - Clear calls-to-action (book appointment, consultation, etc.)
-            
+
             Extract and normalize the following information:
             - Industry/Business type
-            - Tone and brand personality 
+            - Tone and brand personality
             - Key services to highlight
             - Target audience
             - Primary call-to-action
             - Requested page sections
-            
+
             Return a structured brief that will guide page generation."""),
-            ("human", "Chat history and requirements:\n{chat_input}")
-        ])
+    ("human", "Chat history and requirements:\n{chat_input}")
+])
 
-    async def process(self, chat_history: List[Dict[str, str]], user_input: str) -> Brief:
-        """Process chat history and current input into normalized brief"""
-        
-        # Combine chat history into context
-        chat_context = "\n".join([
-            f"{msg['role']}: {msg['content']}" for msg in chat_history
-        ])
-        
-        combined_input = f"Previous chat:\n{chat_context}\n\nLatest input:\n{user_input}"
-        
-        # Generate brief using GPT-5
-        response = await self.llm.ainvoke(
-            self.prompt.format(chat_input=combined_input)
-        )
-        
-        # Parse response into structured brief
-        brief_data = self._parse_brief_response(response.content, user_input)
-        
-        return Brief(**brief_data)
-    
-    def _parse_brief_response(self, llm_response: str, fallback_input: str) -> Dict[str, Any]:
-        """Parse LLM response into brief structure with Growth99 defaults"""
-        
-        # Use GPT-5 to extract structured data
-        extraction_prompt = ChatPromptTemplate.from_messages([
-            ("system", """Extract structured data from the brief analysis. 
+_EXTRACTION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """Extract structured data from the brief analysis.
             Return ONLY a JSON object with these exact keys:
-            {
+            {{
                 "industry": "healthcare/wellness/medical",
-                "business_type": "med-spa/dental/wellness/clinic/hospital", 
+                "business_type": "med-spa/dental/wellness/clinic/hospital",
                 "tone": "professional/warm/modern/luxurious",
                 "key_services": ["service1", "service2"],
                 "target_audience": "description",
@@ -83,24 +94,132 @@ class RequirementsAgent:
                 "sections_requested": ["Hero", "Services", "About", "Contact"],
                 "brand_personality": "optional description",
                 "special_requirements": "optional notes"
-            }"""),
-            ("human", f"Brief analysis:\n{llm_response}\n\nOriginal input:\n{fallback_input}")
-        ])
+            }}"""),
+    ("human", "Brief analysis:\n{llm_response}\n\nOriginal input:\n{fallback_input}")
+])
+
+class RequirementsAgent:
+    prompt = _ANALYSIS_PROMPT
+    extraction_prompt = _EXTRACTION_PROMPT
+
+    def __init__(self, llm_client: ChatOpenAI):
+        self.llm = llm_client
+        # One round-trip straight to a validated Brief; the two-call
+        # analyze-then-extract path remains as the fallback
+        self.structured_llm = llm_client.with_structured_output(Brief)
+        self._brief_cache: OrderedDict[str, Brief] = OrderedDict()
+        self._summary_cache: OrderedDict[str, str] = OrderedDict()
+
+    async def process(self, chat_history: List[Dict[str, str]], user_input: str) -> Brief:
+        """Process chat history and current input into normalized brief"""
         
+        # Long sessions would otherwise pay linearly growing prompt cost on
+        # every turn: keep the last _MAX_TURNS verbatim and fold older
+        # turns into a cached one-shot summary
+        older, recent = chat_history[:-_MAX_TURNS], chat_history[-_MAX_TURNS:]
+
+        # Combine chat history into context; generator avoids materializing
+        # an intermediate list of formatted lines for long conversations
+        chat_context = "\n".join(
+            f"{msg['role']}: {msg['content']}" for msg in recent
+        )
+        if older:
+            summary = await self._summarize_history(older)
+            chat_context = f"[Summary of earlier conversation]: {summary}\n{chat_context}"
+
+        combined_input = f"Previous chat:\n{chat_context}\n\nLatest input:\n{user_input}"
+
+        # Serve identical chat inputs from the LRU cache; re-runs of the
+        # same conversation skip the LLM entirely
+        cache_key = hashlib.sha256(combined_input.encode()).hexdigest()
+        cached = self._brief_cache.get(cache_key)
+        if cached is not None:
+            self._brief_cache.move_to_end(cache_key)
+            return cached
+
+        prompt = self.prompt.format(chat_input=combined_input)
+
+        # Structured output yields the Brief in a single round-trip instead
+        # of analyzing prose and re-extracting JSON from it
+        try:
+            brief = await self.structured_llm.ainvoke(prompt)
+        except Exception as e:
+            logger.warning("Structured brief extraction failed: %s", e)
+            # Fallback: original two-stage analyze-then-extract path
+            response = await self.llm.ainvoke(prompt)
+            brief = await self._parse_brief_response(response.content, user_input)
+
+        self._brief_cache[cache_key] = brief
+        self._brief_cache.move_to_end(cache_key)
+        if len(self._brief_cache) > _BRIEF_CACHE_SIZE:
+            self._brief_cache.popitem(last=False)
+        return brief
+
+    async def process_batch(
+        self,
+        items: List[Tuple[List[Dict[str, str]], str]],
+        max_concurrency: int = 8
+    ) -> List[Brief]:
+        """Process several (chat_history, user_input) pairs concurrently.
+
+        Runs the full per-item pipeline - so each item still benefits from
+        the brief cache and summary window - with a semaphore bounding the
+        LLM fan-out, collapsing N serial round-trips into roughly one.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _bounded(chat_history: List[Dict[str, str]], user_input: str) -> Brief:
+            async with semaphore:
+                return await self.process(chat_history, user_input)
+
+        return list(await asyncio.gather(
+            *[_bounded(chat_history, user_input) for chat_history, user_input in items]
+        ))
+
+    async def _summarize_history(self, turns: List[Dict[str, str]]) -> str:
+        """Summarize older chat turns once, keyed on their content"""
+
+        cache_key = hashlib.sha256(json.dumps(turns, sort_keys=True).encode()).hexdigest()
+        cached = self._summary_cache.get(cache_key)
+        if cached is not None:
+            self._summary_cache.move_to_end(cache_key)
+            return cached
+
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in turns)
+        try:
+            response = await self.llm.ainvoke(
+                "Summarize this conversation in one short paragraph, keeping "
+                f"every stated business requirement and preference:\n{transcript}"
+            )
+            summary = response.content.strip()
+        except Exception as e:
+            logger.warning("Failed to summarize chat history: %s", e)
+            # Degrade to the verbatim transcript rather than losing context
+            summary = transcript
+
+        self._summary_cache[cache_key] = summary
+        self._summary_cache.move_to_end(cache_key)
+        if len(self._summary_cache) > _SUMMARY_CACHE_SIZE:
+            self._summary_cache.popitem(last=False)
+        return summary
+
+    async def _parse_brief_response(self, llm_response: str, fallback_input: str) -> Brief:
+        """Parse LLM response into a Brief with Growth99 defaults"""
+
         try:
-            extraction_response = self.llm.invoke(extraction_prompt)
-            import json
-            return json.loads(extraction_response.content)
+            # Stream the extraction response so receive overlaps with the
+            # event loop's other work instead of buffering in the client.
+            # model_validate_json goes str -> model in one pydantic_core
+            # pass, skipping the intermediate dict
+            chunks = []
+            async for chunk in self.llm.astream(
+                self.extraction_prompt.format(
+                    llm_response=llm_response,
+                    fallback_input=fallback_input
+                )
+            ):
+                chunks.append(chunk.content)
+            return Brief.model_validate_json(extract_json_from_text("".join(chunks)))
         except:
             # Fallback to Growth99 healthcare defaults
-            return {
-                "industry": "healthcare",
-                "business_type": "medical spa", 
-                "tone": "professional",
-                "key_services": ["Advanced Treatments", "Expert Care", "Personalized Service"],
-                "target_audience": "Health-conscious individuals seeking professional care",
-                "primary_cta": "Book a Free Consultation",
-                "sections_requested": ["Hero", "Services", "About", "Testimonials", "Contact"],
-                "brand_personality": "Professional, trustworthy, and caring",
-                "special_requirements": None
-            }
\ No newline at end of file
+            return _DEFAULT_BRIEF
\ No newline at end of file
@@ -1,8 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, List, Any, Optional
+import functools
+import logging
 import os
+import orjson
+import httpx
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
@@ -14,10 +19,16 @@ from langchain_groq import ChatGroq
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(
     title="Growth99 Figma Plugin API (MVP)",
     description="MVP Backend API for Growth99 AI Page Generator Figma Plugin",
-    version="1.0.0"
+    version="1.0.0",
+    # Serialize responses with orjson: page specs with hundreds of Figma
+    # nodes are tens of KB, and orjson encodes them several times faster
+    # than the default json encoder
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS for Figma plugin (MVP - permissive)
@@ -34,11 +45,28 @@ supabase_url = os.getenv("SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_ANON_KEY")
 supabase: Client = create_client(supabase_url, supabase_key) if supabase_url and supabase_key else None
 
-# LLM clients using LangChain partner libraries
-def get_llm_client(model_name: str = "gpt-5", temperature: float = 0.7):
-    """Get LLM client using LangChain partner libraries - GPT-5 as default"""
+# Shared pooled HTTP client so concurrent LLM calls reuse keep-alive
+# connections instead of paying a TLS handshake per request
+http_async_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+)
+
+# LLM clients using LangChain partner libraries. Cached per
+# (model, temperature) so each request reuses the already-built client
+# (and its connection pool) instead of re-instantiating one per endpoint
+@functools.lru_cache(maxsize=16)
+def get_llm_client(model_name: str = "gpt-5", temperature: float = 0.7,
+                   latency_optimized: bool = False):
+    """Get LLM client using LangChain partner libraries - GPT-5 as default.
+
+    latency_optimized opts into OpenAI's priority service tier for hops
+    that block a response (verification, brief extraction); leave it off
+    for planning calls where quality-per-dollar matters more.
+    """
     if model_name.startswith("gpt-"):
-        return ChatOpenAI(model=model_name, temperature=temperature)
+        extra_body = {"service_tier": "priority"} if latency_optimized else None
+        return ChatOpenAI(model=model_name, temperature=temperature,
+                          http_async_client=http_async_client, extra_body=extra_body)
     elif model_name.startswith("claude-"):
         return ChatAnthropic(model=model_name, temperature=temperature)
     elif model_name.startswith("gemini-"):
@@ -47,7 +75,21 @@ def get_llm_client(model_name: str = "gpt-5", temperature: float = 0.7):
         return ChatGroq(model=model_name, temperature=temperature)
     else:
         # Default to OpenAI GPT-5
-        return ChatOpenAI(model="gpt-5", temperature=temperature)
+        return ChatOpenAI(model="gpt-5", temperature=temperature, http_async_client=http_async_client)
+
+@app.on_event("startup")
+async def warm_llm_client():
+    """Build the default client and workflow at startup.
+
+    Populating the caches here moves LLM client construction, agent
+    setup and LangGraph compilation off the first request's critical
+    path; only the actual LLM round-trip remains cold (a warm-up ping
+    would bill a completion for a few dozen saved milliseconds).
+    """
+    from .workflows.page_generation_workflow import create_workflow
+
+    app.state.llm = get_llm_client()
+    app.state.workflow = create_workflow()
 
 # Pydantic models
 class SessionStartRequest(BaseModel):
@@ -96,6 +138,10 @@ class ImageGenerateRequest(BaseModel):
     provider: str = "replicate"
     model: str = "stability-ai/sdxl"
 
+class PageVerifyRequest(BaseModel):
+    composed_spec: Dict[str, Any]
+    design_system: Dict[str, Any]
+
 # API Routes
 @app.get("/")
 async def root():
@@ -116,51 +162,51 @@ async def start_session(request: SessionStartRequest):
                 "figma_file_id": request.figmaFileId,
                 "created_at": "now()"
             }).execute()
-        except Exception as e:
-            print(f"Failed to store session in Supabase: {e}")
+        except Exception:
+            logger.exception("Failed to store session in Supabase")
     
     return SessionResponse(
         projectId=project_id,
         userId=user_id
     )
 
+# One reference agent for the whole process: its pooled Firecrawl client
+# leaks sockets if rebuilt (and never closed) per request, and its scrape
+# TTL and analysis LRU caches only pay off when the instance survives
+# between calls - the workflow path already shares its agents this way
+@functools.lru_cache(maxsize=1)
+def get_reference_agent():
+    from .agents.reference_agent import ReferenceAgent
+    return ReferenceAgent(get_llm_client())
+
 @app.post("/v1/reference/analyze", response_model=DesignSystem)
 async def analyze_reference(request: ReferenceAnalyzeRequest):
     """Analyze reference URLs and extract design system using LangGraph agents"""
-    
+
+    reference_agent = get_reference_agent()
+
     try:
-        from .agents.reference_agent import ReferenceAgent
-        
-        llm_client = get_llm_client()
-        reference_agent = ReferenceAgent(llm_client)
-        
         # Analyze URLs using Firecrawl + GPT-5
-        design_system = await reference_agent.analyze_references(
+        return await reference_agent.analyze_references(
             request.urls,
             request.brief or ""
         )
-        
-        return design_system
-        
-    except Exception as e:
-        print(f"Reference analysis failed: {e}")
-        # Fallback to default healthcare design system
-        from .agents.reference_agent import ReferenceAgent
-        llm_client = get_llm_client()
-        agent = ReferenceAgent(llm_client)
-        return agent._get_default_healthcare_design_system()
+    except Exception:
+        logger.exception("Reference analysis failed")
+        # Fallback to default healthcare design system, reusing the agent
+        # already built above instead of constructing a second one
+        return reference_agent._get_default_healthcare_design_system()
 
 @app.post("/v1/page/plan", response_model=PageSpec)
 async def plan_page(request: PagePlanRequest):
     """Generate a page specification using LangGraph planner agent"""
     
+    from .agents.planner_agent import PlannerAgent
+    from .agents.requirements_agent import Brief
+
+    planner_agent = PlannerAgent(get_llm_client())
+
     try:
-        from .agents.planner_agent import PlannerAgent
-        from .agents.requirements_agent import Brief
-        
-        llm_client = get_llm_client()
-        planner_agent = PlannerAgent(llm_client)
-        
         # Convert request to Brief format (simplified for direct API call)
         brief = Brief(
             industry="healthcare",
@@ -181,8 +227,8 @@ async def plan_page(request: PagePlanRequest):
         
         return page_spec
         
-    except Exception as e:
-        print(f"Page planning failed: {e}")
+    except Exception:
+        logger.exception("Page planning failed")
         # Fallback to default page spec
         return PageSpec(
             pageName=f"{request.pageKind} Page",
@@ -206,12 +252,11 @@ async def plan_page(request: PagePlanRequest):
 async def generate_images(request: ImageGenerateRequest):
     """Generate AI images using Replicate integration"""
     
+    from .agents.image_agent import ImageAgent
+
+    image_agent = ImageAgent(get_llm_client())
+
     try:
-        from .agents.image_agent import ImageAgent
-        
-        llm_client = get_llm_client()
-        image_agent = ImageAgent(llm_client)
-        
         # Generate images using Replicate
         generated_images = await image_agent.generate_images(
             request.slots,
@@ -225,14 +270,47 @@ async def generate_images(request: ImageGenerateRequest):
         
         return result
         
-    except Exception as e:
-        print(f"Image generation failed: {e}")
+    except Exception:
+        logger.exception("Image generation failed")
         # Fallback to placeholder URLs
         result = {}
         for slot in request.slots:
             result[slot.role] = f"https://images.unsplash.com/photo-1559757148-5c350d0d3c56?w=600&h=400&fit=crop&text={slot.role}"
         return result
 
+@app.post("/v1/page/verify")
+async def verify_page(request: PageVerifyRequest):
+    """Verify a composed page spec, streaming issues as newline-delimited JSON
+
+    Rule-based checks land in milliseconds; streaming them while the
+    compliance LLM call is in flight lets the plugin show early findings
+    instead of waiting for the full result.
+    """
+    from .agents.verifier_agent import VerifierAgent
+    from .agents.composer_agent import ComposedPageSpec
+    from .agents.reference_agent import DesignSystem as AgentDesignSystem
+
+    try:
+        composed_spec = ComposedPageSpec(**request.composed_spec)
+        design_system = AgentDesignSystem(**request.design_system)
+    except Exception:
+        logger.exception("Invalid page verification payload")
+        # Structured error instead of a 500 before the stream starts
+        return {"success": False, "error": "Invalid composed_spec or design_system payload"}
+    # Verification blocks the response, so its compliance call rides the
+    # priority service tier
+    verifier = VerifierAgent(get_llm_client(latency_optimized=True))
+
+    async def event_stream():
+        async for event, payload in verifier.verify_page_stream(composed_spec, design_system):
+            if event == "issues":
+                data = {"event": event, "issues": [issue.model_dump() for issue in payload]}
+            else:
+                data = {"event": event, "result": payload.model_dump()}
+            yield orjson.dumps(data) + b"\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
 # New comprehensive workflow endpoint
 @app.post("/v1/generate/complete")
 async def generate_complete_page(request: Dict[str, Any]):
@@ -248,6 +326,7 @@ async def generate_complete_page(request: Dict[str, Any]):
         page_type = request.get("page_type", "Home")
         use_ai_images = request.get("use_ai_images", False)
         model_name = request.get("model_name", "gpt-5")
+        include_debug_metadata = request.get("include_debug_metadata", False)
         
         # Create and execute workflow
         workflow = create_workflow(model_name)
@@ -258,18 +337,48 @@ async def generate_complete_page(request: Dict[str, Any]):
             reference_urls=reference_urls,
             page_type=page_type,
             use_ai_images=use_ai_images,
-            model_name=model_name
+            model_name=model_name,
+            include_debug_metadata=include_debug_metadata
         )
         
         return result
         
     except Exception as e:
+        logger.exception("Complete page generation failed")
         return {
             "success": False,
             "error": f"Complete page generation failed: {str(e)}",
             "final_page_spec": None
         }
 
+@app.post("/v1/generate/stream")
+async def generate_complete_page_stream(request: Dict[str, Any]):
+    """Stream page generation progress as newline-delimited JSON
+
+    Each line is {"node": ..., "update": ...} as a workflow step finishes,
+    so the plugin can render the brief and wireframes while composition
+    and image generation are still in flight; the final "output" line
+    matches the /v1/generate/complete response.
+    """
+    from .workflows.page_generation_workflow import create_workflow
+
+    model_name = request.get("model_name", "gpt-5")
+    workflow = create_workflow(model_name)
+
+    async def event_stream():
+        async for event in workflow.generate_page_stream(
+            chat_history=request.get("chat_history", []),
+            user_input=request.get("user_input", "Create a professional healthcare website"),
+            reference_urls=request.get("reference_urls", []),
+            page_type=request.get("page_type", "Home"),
+            use_ai_images=request.get("use_ai_images", False),
+            model_name=model_name,
+            include_debug_metadata=request.get("include_debug_metadata", False)
+        ):
+            yield orjson.dumps(event) + b"\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -2,9 +2,15 @@
 LangGraph Workflow - Orchestrates all agents for page generation
 """
 
-from typing import Dict, Any, List, TypedDict, Optional
+import asyncio
+import functools
+import logging
+from dataclasses import asdict, is_dataclass
+from typing import AsyncIterator, Dict, Any, List, TypedDict, Optional
+import httpx
 from langgraph.graph import Graph, StateGraph, START, END
 from langchain_openai import ChatOpenAI
+from langchain_anthropic import ChatAnthropic
 
 from ..agents.requirements_agent import RequirementsAgent, Brief
 from ..agents.reference_agent import ReferenceAgent, DesignSystem
@@ -13,6 +19,8 @@ from ..agents.composer_agent import ComposerAgent, ComposedPageSpec
 from ..agents.image_agent import ImageAgent, GeneratedImage
 from ..agents.verifier_agent import VerifierAgent, VerificationResult
 
+logger = logging.getLogger(__name__)
+
 class WorkflowState(TypedDict):
     # Input
     chat_history: List[Dict[str, str]]
@@ -21,30 +29,65 @@ class WorkflowState(TypedDict):
     page_type: str
     use_ai_images: bool
     model_name: str
+    include_debug_metadata: bool
     
     # Agent outputs
     brief: Optional[Brief]
+    # "<business_type> <industry>", derived once from the brief; three
+    # later steps feed it to their agents
+    business_context: Optional[str]
     design_system: Optional[DesignSystem]
     page_spec: Optional[PageSpec]
     composed_spec: Optional[ComposedPageSpec]
     generated_images: Optional[List[GeneratedImage]]
     verification_result: Optional[VerificationResult]
     
+    # In-flight work started by earlier steps (in-process only; never
+    # serialized)
+    early_image_task: Optional[Any]
+    plan_verification_task: Optional[Any]
+
     # Final output
     final_page_spec: Optional[Dict[str, Any]]
     error: Optional[str]
 
+def _route_unless_error(next_nodes):
+    """Condition factory for the error-routing edges.
+
+    Returns next_nodes while the run is healthy and END once a step has
+    recorded an error, so failed runs skip the remaining node dispatches.
+    """
+    def route(state: WorkflowState):
+        return END if state["error"] else next_nodes
+    return route
+
+def _tuned(llm_client: ChatOpenAI, **overrides) -> ChatOpenAI:
+    """Copy of the shared client with per-agent sampling overrides.
+
+    model_copy keeps the underlying HTTP client, so tuning costs no extra
+    connection pools.
+    """
+    return llm_client.model_copy(update=overrides)
+
 class PageGenerationWorkflow:
     def __init__(self, llm_client: ChatOpenAI):
         self.llm = llm_client
-        
-        # Initialize all agents
-        self.requirements_agent = RequirementsAgent(llm_client)
-        self.reference_agent = ReferenceAgent(llm_client)
-        self.planner_agent = PlannerAgent(llm_client)
-        self.composer_agent = ComposerAgent(llm_client)
+
+        # Initialize all agents. Schema-bound extraction and verification
+        # run deterministic with tight completion caps - uncapped calls can
+        # burn the model maximum in completion tokens per hop - while the
+        # creative stages keep the base temperature
+        self.requirements_agent = RequirementsAgent(_tuned(llm_client, temperature=0, max_tokens=512))
+        self.reference_agent = ReferenceAgent(_tuned(llm_client, temperature=0, max_tokens=1500))
+        self.planner_agent = PlannerAgent(_tuned(llm_client, temperature=0.2, max_tokens=2000))
+        self.composer_agent = ComposerAgent(_tuned(llm_client, temperature=0.3, max_tokens=3000))
         self.image_agent = ImageAgent(llm_client)
-        self.verifier_agent = VerifierAgent(llm_client)
+        # Verification sits on the response's critical path, so on OpenAI
+        # its calls additionally opt into the priority service tier
+        verifier_overrides: Dict[str, Any] = {"temperature": 0, "max_tokens": 800}
+        if isinstance(llm_client, ChatOpenAI):
+            verifier_overrides["extra_body"] = {"service_tier": "priority"}
+        self.verifier_agent = VerifierAgent(_tuned(llm_client, **verifier_overrides))
         
         # Build workflow graph
         self.workflow = self._build_workflow()
@@ -62,15 +105,21 @@ class PageGenerationWorkflow:
         workflow.add_node("image_generation", self._image_generation_step)
         workflow.add_node("verification", self._verification_step)
         workflow.add_node("finalization", self._finalization_step)
-        
-        # Define workflow edges
+
+        # Define workflow edges. The early stages form a true data chain
+        # (brief -> design system -> page spec -> composed spec), but image
+        # generation and verification both depend only on the composed spec
+        # and write disjoint keys, so they fan out as sibling nodes - the
+        # compiled graph runs them in the same superstep concurrently - and
+        # fan back in at finalization. Each chain hop is conditional: once a
+        # step records an error the run jumps straight to END instead of
+        # dispatching the remaining nodes just to re-check the flag
         workflow.add_edge(START, "requirements")
-        workflow.add_edge("requirements", "reference_analysis")
-        workflow.add_edge("reference_analysis", "planning")
-        workflow.add_edge("planning", "composition")
-        workflow.add_edge("composition", "image_generation")
-        workflow.add_edge("image_generation", "verification")
-        workflow.add_edge("verification", "finalization")
+        workflow.add_conditional_edges("requirements", _route_unless_error("reference_analysis"))
+        workflow.add_conditional_edges("reference_analysis", _route_unless_error("planning"))
+        workflow.add_conditional_edges("planning", _route_unless_error("composition"))
+        workflow.add_conditional_edges("composition", _route_unless_error(["image_generation", "verification"]))
+        workflow.add_edge(["image_generation", "verification"], "finalization")
         workflow.add_edge("finalization", END)
         
         return workflow.compile()
@@ -82,197 +131,320 @@ class PageGenerationWorkflow:
         reference_urls: List[str] = None,
         page_type: str = "Home",
         use_ai_images: bool = False,
-        model_name: str = "gpt-5"
+        model_name: str = "gpt-5",
+        include_debug_metadata: bool = False
     ) -> Dict[str, Any]:
-        """Execute complete page generation workflow"""
-        
-        initial_state: WorkflowState = {
+        """Execute complete page generation workflow.
+
+        include_debug_metadata embeds the full brief, design system and
+        verification result in the response metadata; leave it off in
+        production, where the plugin only needs the nodes and the payload
+        shrinks accordingly.
+        """
+
+        initial_state = self._initial_state(
+            chat_history, user_input, reference_urls, page_type,
+            use_ai_images, model_name, include_debug_metadata
+        )
+
+        try:
+            # Execute workflow
+            final_state = await self.workflow.ainvoke(initial_state)
+            return self._format_output(final_state)
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "final_page_spec": None
+            }
+
+    async def generate_page_stream(
+        self,
+        chat_history: List[Dict[str, str]],
+        user_input: str,
+        reference_urls: List[str] = None,
+        page_type: str = "Home",
+        use_ai_images: bool = False,
+        model_name: str = "gpt-5",
+        include_debug_metadata: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield node-tagged updates as each workflow step completes.
+
+        Perceived latency drops to the first node's completion: the plugin
+        can show the extracted brief and draft wireframes from the page
+        spec while composition and image generation are still running. The
+        closing "output" event carries the same payload generate_page
+        returns.
+        """
+
+        initial_state = self._initial_state(
+            chat_history, user_input, reference_urls, page_type,
+            use_ai_images, model_name, include_debug_metadata
+        )
+
+        final_state = dict(initial_state)
+        try:
+            async for update in self.workflow.astream(initial_state, stream_mode="updates"):
+                for node_name, partial in update.items():
+                    if not partial:
+                        continue
+                    final_state.update(partial)
+                    payload = self._serialize_update(partial)
+                    if payload:
+                        yield {"node": node_name, "update": payload}
+            yield {"node": "output", "update": self._format_output(final_state)}
+
+        except Exception as e:
+            yield {
+                "node": "output",
+                "update": {"success": False, "error": str(e), "final_page_spec": None}
+            }
+
+    def _initial_state(
+        self,
+        chat_history: List[Dict[str, str]],
+        user_input: str,
+        reference_urls: Optional[List[str]],
+        page_type: str,
+        use_ai_images: bool,
+        model_name: str,
+        include_debug_metadata: bool
+    ) -> WorkflowState:
+        """Fresh state dict shared by the blocking and streaming entry points"""
+        return {
             "chat_history": chat_history or [],
             "user_input": user_input,
             "reference_urls": reference_urls or [],
             "page_type": page_type,
             "use_ai_images": use_ai_images,
             "model_name": model_name,
+            "include_debug_metadata": include_debug_metadata,
             "brief": None,
+            "business_context": None,
             "design_system": None,
             "page_spec": None,
             "composed_spec": None,
             "generated_images": None,
             "verification_result": None,
+            "early_image_task": None,
+            "plan_verification_task": None,
             "final_page_spec": None,
             "error": None
         }
-        
-        try:
-            # Execute workflow
-            final_state = await self.workflow.ainvoke(initial_state)
-            return self._format_output(final_state)
-            
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "final_page_spec": None
-            }
-    
-    async def _requirements_step(self, state: WorkflowState) -> WorkflowState:
+
+    @staticmethod
+    def _serialize_update(partial: Dict[str, Any]) -> Dict[str, Any]:
+        """JSON-safe view of a node's partial update.
+
+        Task handles stay in-process, pydantic models dump through
+        pydantic-core, and generated-image dataclasses convert via asdict;
+        everything else is already plain data.
+        """
+        payload: Dict[str, Any] = {}
+        for key, value in partial.items():
+            if key in ("early_image_task", "plan_verification_task"):
+                continue
+            if hasattr(value, "model_dump"):
+                payload[key] = value.model_dump()
+            elif isinstance(value, list) and value and is_dataclass(value[0]):
+                payload[key] = [asdict(item) for item in value]
+            else:
+                payload[key] = value
+        return payload
+
+
+    # Steps return only the keys they produce rather than the whole state:
+    # LangGraph merges partial updates into its channels, so each hop ships
+    # a couple of references instead of re-writing every field, and steps
+    # can't accidentally clobber keys they don't own.
+
+    async def _requirements_step(self, state: WorkflowState) -> Dict[str, Any]:
         """Step 1: Process requirements into structured brief"""
-        
+
         try:
             brief = await self.requirements_agent.process(
                 state["chat_history"],
                 state["user_input"]
             )
-            state["brief"] = brief
-            
+            return {
+                "brief": brief,
+                "business_context": f"{brief.business_type} {brief.industry}"
+            }
+
         except Exception as e:
-            state["error"] = f"Requirements processing failed: {str(e)}"
-        
-        return state
-    
-    async def _reference_analysis_step(self, state: WorkflowState) -> WorkflowState:
+            return {"error": f"Requirements processing failed: {str(e)}"}
+
+    async def _reference_analysis_step(self, state: WorkflowState) -> Dict[str, Any]:
         """Step 2: Analyze reference URLs for design system extraction"""
-        
-        if state["error"]:
-            return state
-        
+
         try:
-            brief_context = f"{state['brief'].business_type} {state['brief'].industry}" if state["brief"] else ""
-            
             design_system = await self.reference_agent.analyze_references(
                 state["reference_urls"],
-                brief_context
+                state["business_context"] or ""
             )
-            state["design_system"] = design_system
-            
+            return {"design_system": design_system}
+
         except Exception as e:
-            state["error"] = f"Reference analysis failed: {str(e)}"
-        
-        return state
-    
-    async def _planning_step(self, state: WorkflowState) -> WorkflowState:
+            return {"error": f"Reference analysis failed: {str(e)}"}
+
+    async def _planning_step(self, state: WorkflowState) -> Dict[str, Any]:
         """Step 3: Create page specification from brief and design system"""
-        
-        if state["error"]:
-            return state
-        
+
         try:
             page_spec = await self.planner_agent.create_page_spec(
                 state["brief"],
                 state["design_system"],
                 state["page_type"]
             )
-            state["page_spec"] = page_spec
-            
+
+            # Plan-level checks need nothing from composition; start them
+            # now so they overlap the composition step
+            return {
+                "page_spec": page_spec,
+                "plan_verification_task": asyncio.ensure_future(
+                    self.verifier_agent.verify_plan(page_spec, state["brief"])
+                )
+            }
+
         except Exception as e:
-            state["error"] = f"Page planning failed: {str(e)}"
-        
-        return state
-    
-    async def _composition_step(self, state: WorkflowState) -> WorkflowState:
+            return {"error": f"Page planning failed: {str(e)}"}
+
+    async def _composition_step(self, state: WorkflowState) -> Dict[str, Any]:
         """Step 4: Compose detailed Figma node specifications"""
-        
-        if state["error"]:
-            return state
-        
+
+        updates: Dict[str, Any] = {}
         try:
-            composed_spec = await self.composer_agent.compose_page(
+            # Image slots are a pure function of the page sections, so when
+            # AI images are requested their generation can start while the
+            # composition LLM call is still in flight
+            if state["use_ai_images"]:
+                early_slots = self._derive_image_slots(state["page_spec"], state["design_system"])
+                if early_slots:
+                    updates["early_image_task"] = asyncio.ensure_future(
+                        self.image_agent.generate_images(early_slots, state["business_context"])
+                    )
+
+            updates["composed_spec"] = await self.composer_agent.compose_page(
                 state["page_spec"],
                 state["design_system"]
             )
-            state["composed_spec"] = composed_spec
-            
+
         except Exception as e:
-            state["error"] = f"Page composition failed: {str(e)}"
-        
-        return state
+            # The run routes to END on error, so nothing would ever await
+            # the speculative fan-out; cancel it instead of letting the
+            # Replicate spend continue with no consumer
+            early_task = updates.pop("early_image_task", None)
+            if early_task is not None:
+                early_task.cancel()
+            updates["error"] = f"Page composition failed: {str(e)}"
+
+        return updates
+
+    def _derive_image_slots(self, page_spec: PageSpec, design_system: DesignSystem) -> List[Any]:
+        """Derive the image slots composition will produce, without the LLM.
+
+        The composer builds slots deterministically per section, so this
+        pre-pass yields the same list compose_page will attach to the
+        composed spec. Failures just disable the head start.
+        """
+        slots = []
+        try:
+            for section in page_spec.sections:
+                result = self.composer_agent._compose_section(section, design_system)
+                if isinstance(result, tuple):
+                    slots.extend(result[1])
+        except Exception:
+            return []
+        return slots
     
-    async def _image_generation_step(self, state: WorkflowState) -> WorkflowState:
-        """Step 5: Generate AI images if requested"""
-        
-        if state["error"]:
-            return state
-        
+    async def _image_generation_step(self, state: WorkflowState) -> Dict[str, Any]:
+        """Step 5: Generate AI images if requested (runs beside verification)"""
+
         try:
-            if state["use_ai_images"] and state["composed_spec"].imageSlots:
-                business_context = f"{state['brief'].business_type} {state['brief'].industry}"
-                
+            if state["early_image_task"] is not None:
+                # Generation started during composition; just collect it
+                return {"generated_images": await state["early_image_task"]}
+            elif state["use_ai_images"] and state["composed_spec"].imageSlots:
                 generated_images = await self.image_agent.generate_images(
                     state["composed_spec"].imageSlots,
-                    business_context
+                    state["business_context"]
                 )
-                state["generated_images"] = generated_images
+                return {"generated_images": generated_images}
             else:
-                state["generated_images"] = []
-                
-        except Exception as e:
+                return {"generated_images": []}
+
+        except Exception:
             # Don't fail workflow for image generation errors
-            print(f"Image generation failed: {e}")
-            state["generated_images"] = []
-        
-        return state
-    
-    async def _verification_step(self, state: WorkflowState) -> WorkflowState:
+            logger.exception("Image generation failed")
+            return {"generated_images": []}
+
+    async def _verification_step(self, state: WorkflowState) -> Dict[str, Any]:
         """Step 6: Verify page specification quality and compliance"""
-        
-        if state["error"]:
-            return state
-        
+
         try:
             verification_result = await self.verifier_agent.verify_page(
                 state["composed_spec"],
                 state["design_system"],
                 state["brief"].target_audience
             )
-            state["verification_result"] = verification_result
-            
-        except Exception as e:
+
+            # Merge the plan-level checks launched during planning
+            if state["plan_verification_task"] is not None:
+                plan_issues = await state["plan_verification_task"]
+                if plan_issues:
+                    verification_result.issues[:0] = plan_issues
+                    verification_result.is_valid = not any(
+                        issue.severity == "error" for issue in verification_result.issues
+                    )
+
+            return {"verification_result": verification_result}
+
+        except Exception:
             # Don't fail for verification errors, but log them
-            print(f"Verification failed: {e}")
-            state["verification_result"] = None
-        
-        return state
-    
-    async def _finalization_step(self, state: WorkflowState) -> WorkflowState:
+            logger.exception("Verification failed")
+            return {"verification_result": None}
+
+    async def _finalization_step(self, state: WorkflowState) -> Dict[str, Any]:
         """Step 7: Finalize output format for Figma plugin"""
-        
-        if state["error"]:
-            return state
-        
+
         try:
-            # Create final page specification for Figma plugin
+            # The brief/design-system/verification dumps are debug-only:
+            # the plugin renders from figmaNodes, so the default payload
+            # carries just the node count and skips serializing them
+            metadata: Dict[str, Any] = {"totalNodes": state["composed_spec"].totalNodes}
+            if state["include_debug_metadata"]:
+                metadata.update({
+                    "brief": state["brief"].model_dump() if state["brief"] else None,
+                    "designSystem": state["design_system"].model_dump() if state["design_system"] else None,
+                    "verification": state["verification_result"].model_dump() if state["verification_result"] else None
+                })
+
+            # Create final page specification for Figma plugin. model_dump
+            # serializes nested models through pydantic-core in one pass;
+            # __dict__ left child FigmaNodeSpec/ValidationIssue objects
+            # unserialized inside the payload
             final_spec = {
                 "pageName": state["composed_spec"].pageName,
-                "sections": self._convert_to_plugin_format(state["page_spec"].sections),
+                # Plugin sections are just {type, props}; referencing the
+                # props dicts directly skips a deep copy per section
+                "sections": [
+                    {"type": section.type, "props": section.props}
+                    for section in state["page_spec"].sections
+                ],
                 "assets": state["page_spec"].assets,
-                "figmaNodes": [node.__dict__ for node in state["composed_spec"].figmaNodes],
-                "images": [img.__dict__ for img in state["generated_images"]] if state["generated_images"] else [],
-                "metadata": {
-                    "totalNodes": state["composed_spec"].totalNodes,
-                    "brief": state["brief"].__dict__ if state["brief"] else None,
-                    "designSystem": state["design_system"].__dict__ if state["design_system"] else None,
-                    "verification": state["verification_result"].__dict__ if state["verification_result"] else None
-                }
+                # One include-filtered dump walks the whole node tree in a
+                # single pydantic-core pass instead of re-entering Python
+                # for every node
+                "figmaNodes": state["composed_spec"].model_dump(include={"figmaNodes"})["figmaNodes"],
+                "images": [asdict(img) for img in state["generated_images"]] if state["generated_images"] else [],
+                "metadata": metadata
             }
-            
-            state["final_page_spec"] = final_spec
-            
+
+            return {"final_page_spec": final_spec}
+
         except Exception as e:
-            state["error"] = f"Finalization failed: {str(e)}"
-        
-        return state
-    
-    def _convert_to_plugin_format(self, sections) -> List[Dict[str, Any]]:
-        """Convert sections to plugin-compatible format"""
-        
-        plugin_sections = []
-        for section in sections:
-            plugin_sections.append({
-                "type": section.type,
-                "props": section.props
-            })
-        
-        return plugin_sections
+            return {"error": f"Finalization failed: {str(e)}"}
     
     def _format_output(self, final_state: WorkflowState) -> Dict[str, Any]:
         """Format final workflow output"""
@@ -287,13 +459,35 @@ class PageGenerationWorkflow:
         return {
             "success": True,
             "final_page_spec": final_state["final_page_spec"],
-            "verification": final_state["verification_result"].__dict__ if final_state["verification_result"] else None,
+            "verification": final_state["verification_result"].model_dump() if final_state["verification_result"] else None,
             "images_generated": len(final_state["generated_images"]) if final_state["generated_images"] else 0
         }
 
-# Workflow instance for easy reuse
+# Shared pooled HTTP client for the workflow-owned OpenAI clients. The
+# _tuned model_copy keeps this same pool, so all six agents' concurrent
+# calls multiplex over keep-alive connections instead of each paying a
+# TLS handshake
+_HTTP_ASYNC_CLIENT = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+)
+
+# Workflow instance for easy reuse. Cached per model: the compiled graph,
+# prompt templates and six agents are expensive to rebuild and carry no
+# per-request state (that lives in WorkflowState), so concurrent requests
+# safely share one instance - and its agent-level caches - per model
+@functools.lru_cache(maxsize=8)
 def create_workflow(model_name: str = "gpt-5") -> PageGenerationWorkflow:
-    """Create and return a configured workflow instance"""
-    
-    llm_client = ChatOpenAI(model=model_name, temperature=0.7)
+    """Create and return a configured workflow instance.
+
+    Routes claude- models to ChatAnthropic so the multi-agent pipeline can
+    run against Anthropic; its automatic prompt caching then reuses the
+    static system prefixes the agents already front-load. Everything else
+    keeps the OpenAI default.
+    """
+
+    if model_name.startswith("claude-"):
+        llm_client = ChatAnthropic(model=model_name, temperature=0.7)
+    else:
+        llm_client = ChatOpenAI(model=model_name, temperature=0.7,
+                                http_async_client=_HTTP_ASYNC_CLIENT)
     return PageGenerationWorkflow(llm_client)
\ No newline at end of file